@@ -1,14 +1,32 @@
+from crud.categories import prime_default_categories, seed_default_categories
 from routes.users import user_router
+from routes.budgets import budget_router
+from routes.analytics import analytics_router
 from routes.categories import category_router
+from routes.health import health_router
+from routes.metrics import metrics_router
+from routes.transactions import expense_router, income_router
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from middleware.auth import auth_middleware
-from utils.utils import create_default_categories
+from middleware.auth import AuthMiddleware
+from utils.codec import JSONResponse
+from storage.db import (
+    check_replicas,
+    dispose_engines,
+    warm_pool,
+    watch_for_leaks,
+    watch_replicas,
+)
+from storage.redis import redis_cache
+from utils.hashing import password_hasher
+from utils.serializers import build_serializers
+import asyncio
 import os
+import signal
+import threading
 
-
-app = FastAPI()
+app = FastAPI(default_response_class=JSONResponse)
 
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -18,13 +36,23 @@ UPLOAD_DIR = os.path.join(STATIC_DIR, "uploads")
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
 app.state.UPLOAD_DIR = UPLOAD_DIR
+# set once startup has warmed the worker up, ready is cleared as soon as the
+# worker is told to stop
+app.state.warmed_up = False
+app.state.ready = False
 
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 app.include_router(user_router)
 app.include_router(category_router)
+app.include_router(health_router)
+app.include_router(metrics_router)
+app.include_router(expense_router)
+app.include_router(income_router)
+app.include_router(budget_router)
+app.include_router(analytics_router)
 
-app.middleware("http")(auth_middleware)
+app.add_middleware(AuthMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -41,8 +69,52 @@ app.add_middleware(
 
 
 @app.on_event("startup")
-def startup_event():
-    create_default_categories()
+async def startup_event():
+    await seed_default_categories()
+    redis_cache.start_invalidation_listener()
+    app.state.leak_watcher = asyncio.create_task(watch_for_leaks())
+    app.state.replica_watcher = asyncio.create_task(watch_replicas())
+    await warm_up()
+    clear_readiness_on_exit()
+    app.state.warmed_up = app.state.ready = True
+
+
+async def warm_up():
+    """Pays the first-request costs before the worker takes traffic: pool
+    connections, the first replica lag check, the default category catalog
+    and the row serializers"""
+    await warm_pool()
+    await check_replicas()
+    await prime_default_categories()
+    build_serializers()
+
+
+def clear_readiness_on_exit():
+    """Turns /readyz to 503 on SIGTERM or SIGINT, before the server drains
+    in-flight requests, then hands the signal on to the server's handler"""
+    if threading.current_thread() is not threading.main_thread():
+        return
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        previous = signal.getsignal(signum)
+        if not callable(previous):
+            continue
+
+        def handle_exit(signum, frame, previous=previous):
+            app.state.ready = False
+            previous(signum, frame)
+
+        signal.signal(signum, handle_exit)
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # in-flight requests have finished, the server waited for them
+    app.state.ready = False
+    app.state.leak_watcher.cancel()
+    app.state.replica_watcher.cancel()
+    await redis_cache.close()
+    await dispose_engines()
+    password_hasher.shutdown()
 
 
 @app.get("/")
@@ -0,0 +1,132 @@
+#!/usr/bin/python3
+"""Benchmarks the analytics queries against loading ORM rows in Python.
+
+For each size, creates a throwaway user with that many expenses and
+incomes spread over three years, then times the category breakdown, the
+daily series and the month over month report, next to the naive approach
+of loading every Expense object and summing in a loop. Needs the app's
+MySQL environment; the user and its rows are deleted at the end.
+
+Run from the backend directory:
+    python -m benchmarks.analytics [rows,rows,...]
+"""
+import asyncio
+import random
+import sys
+from crud.analytics import (
+    get_category_breakdown,
+    get_month_over_month,
+    get_time_series,
+)
+from crud.categories import seed_default_categories
+from datetime import datetime, timedelta
+from models.category import Category
+from models.expense import Expense
+from models.income import Income
+from models.user import User
+from sqlalchemy import delete, select
+from storage.db import AsyncSessionLocal, SessionLocal, async_engine, engine
+from time import perf_counter
+from uuid import uuid4
+
+BATCH_SIZE = 20_000
+DAYS = 3 * 365
+
+
+def load(user_id: str, rows: int, category_ids: list[str]):
+    start = datetime.now() - timedelta(days=DAYS)
+    with engine.begin() as conn:
+        for model, count in ((Expense, rows), (Income, rows // 10)):
+            for offset in range(0, count, BATCH_SIZE):
+                batch = [
+                    {
+                        "id": str(uuid4()),
+                        "user_id": user_id,
+                        "category_id": random.choice(category_ids),
+                        "amount": random.randrange(100, 50_000),  # minor units
+                        "timestamp": start
+                        + timedelta(seconds=random.randrange(DAYS * 86400)),
+                        "is_deleted": False,
+                    }
+                    for _ in range(min(BATCH_SIZE, count - offset))
+                ]
+                conn.execute(model.__table__.insert(), batch)
+
+
+async def naive_breakdown(db, user_id: str, start: datetime, end: datetime):
+    expenses = await db.scalars(
+        select(Expense).where(
+            Expense.user_id == user_id,
+            Expense.is_deleted == False,
+            Expense.timestamp >= start,
+            Expense.timestamp < end,
+        )
+    )
+    totals = {}
+    for expense in expenses:
+        totals[expense.category_id] = (
+            totals.get(expense.category_id, 0) + expense.amount
+        )
+    return totals
+
+
+async def timed(label: str, coroutine):
+    start = perf_counter()
+    await coroutine
+    print(f"    {label:<28} {(perf_counter() - start) * 1000:10.1f} ms")
+
+
+async def run(rows: int):
+    user_id = str(uuid4())
+    with SessionLocal() as db:
+        db.add(
+            User(
+                id=user_id, username="benchmark", email=f"{user_id}@bench", password="-"
+            )
+        )
+        db.commit()
+        category_ids = db.scalars(select(Category.id).where(Category.user_id == None))
+        category_ids = category_ids.all()
+    try:
+        start = perf_counter()
+        load(user_id, rows, category_ids)
+        print(f"\n{rows} expenses loaded in {perf_counter() - start:.1f}s")
+        end = datetime.now() + timedelta(days=1)
+        year_ago = end - timedelta(days=365)
+        async with AsyncSessionLocal() as db:
+            await timed(
+                "breakdown, last year",
+                get_category_breakdown(db, user_id, "expenses", year_ago, end),
+            )
+            await timed(
+                "breakdown, all time",
+                get_category_breakdown(
+                    db, user_id, "expenses", datetime(2000, 1, 1), end
+                ),
+            )
+            await timed(
+                "daily series, last year",
+                get_time_series(db, user_id, "day", year_ago, end),
+            )
+            await timed("month over month, 36", get_month_over_month(db, user_id, 36))
+            await timed(
+                "naive ORM breakdown, last year",
+                naive_breakdown(db, user_id, year_ago, end),
+            )
+    finally:
+        with engine.begin() as conn:
+            for model in (Expense, Income):
+                conn.execute(delete(model).where(model.user_id == user_id))
+            conn.execute(delete(User).where(User.id == user_id))
+
+
+async def main(sizes: list[int]):
+    await seed_default_categories()
+    for rows in sizes:
+        await run(rows)
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    sizes = sys.argv[1] if len(sys.argv) > 1 else "100000,1000000"
+    asyncio.run(main([int(size) for size in sizes.split(",")]))
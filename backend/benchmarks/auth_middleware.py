@@ -0,0 +1,99 @@
+#!/usr/bin/python3
+"""Compares the per-request overhead of the ASGI AuthMiddleware with the
+previous call_next based auth middleware.
+
+Run from the backend directory: python -m benchmarks.auth_middleware
+"""
+import asyncio
+from time import perf_counter
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from middleware.auth import AuthMiddleware
+
+REQUESTS = 20000
+
+
+async def legacy_auth_middleware(request: Request, call_next):
+    """The public path check and header check of the old auth_middleware"""
+    path_list = [
+        "/docs",
+        "/openapi.json",
+        "/redoc",
+        "/favicon.ico",
+        "/register",
+        "/login",
+        "/ping",
+    ]
+    if any(request.url.path.startswith(path) for path in path_list):
+        return await call_next(request)
+    auth_header = request.headers.get("Authorization")
+    if not auth_header or not auth_header.startswith("Bearer "):
+        return JSONResponse(
+            status_code=401, content={"message": "Unauthorized: Not Authenticated"}
+        )
+    return await call_next(request)
+
+
+def build_app(stack: str) -> FastAPI:
+    """Builds a one route app wrapped by the given middleware stack"""
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return "pong"
+
+    @app.get("/categories")
+    async def categories():
+        return []
+
+    if stack == "legacy":
+        app.middleware("http")(legacy_auth_middleware)
+    elif stack == "asgi":
+        app.add_middleware(AuthMiddleware, public_paths=["/ping"])
+    return app
+
+
+async def run(app, path: str) -> float:
+    """Returns the mean microseconds per request for a path"""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"localhost")],
+        "client": ("127.0.0.1", 1234),
+        "server": ("localhost", 8000),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    for _ in range(500):
+        await app(dict(scope), receive, send)
+    start = perf_counter()
+    for _ in range(REQUESTS):
+        await app(dict(scope), receive, send)
+    return (perf_counter() - start) / REQUESTS * 1e6
+
+
+async def main():
+    for stack in ("none", "legacy", "asgi"):
+        app = build_app(stack)
+        public = await run(app, "/ping")
+        rejected = await run(app, "/categories")
+        print(
+            f"{stack:>7}: public route {public:8.1f} us/req, "
+            f"unauthenticated route {rejected:8.1f} us/req"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
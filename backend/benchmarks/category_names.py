@@ -0,0 +1,76 @@
+#!/usr/bin/python3
+"""Benchmarks category_normalizer on 100k category names.
+
+Compares the old normalizer, which built an inflect engine and compiled its
+patterns on every call, with the memoized one: first on unique names (every
+call a cache miss) and then on names repeating as they do in requests. No
+database is needed.
+
+Run from the backend directory:
+    python -m benchmarks.category_names [names]
+"""
+import inflect
+import random
+import re
+import sys
+import unicodedata
+from time import perf_counter
+from utils.utils import DEFAULT_CATEGORIES, category_normalizer
+
+WORDS = ["Rent", "Café", "School", "Fuel", "Data", "Gift", "Loan", "Pet", "Gym"]
+SUFFIXES = ["s", "es", "", " & Bills", " fees!", "  Costs"]
+
+
+def legacy_normalizer(name: str):
+    """category_normalizer as it was, with the shadowed inflect name fixed"""
+    engine = inflect.engine()
+    name = name.lower()
+    name = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode("ascii")
+    name = name.replace("&", "and")
+    name = re.sub(r"[^\w\s]", "", name)
+    name = re.sub(r"\s+", " ", name)
+    words = name.split()
+    if len(words) > 0:
+        singular = engine.singular_noun(words[-1])
+        if singular:
+            words[-1] = singular
+    return " ".join(words)
+
+
+def names(count: int) -> list:
+    """Unique names mixing plurals, punctuation and accents"""
+    output = []
+    for i in range(count):
+        word = WORDS[i % len(WORDS)]
+        output.append(f"{word} {i}{SUFFIXES[i % len(SUFFIXES)]}")
+    return output
+
+
+def timed(label: str, func, values: list) -> float:
+    start = perf_counter()
+    for value in values:
+        func(value)
+    seconds = perf_counter() - start
+    print(f"    {label:<36} {seconds * 1e6 / len(values):8.2f} us/name")
+    return seconds
+
+
+def main(count: int):
+    unique = names(count)
+    # requests mostly repeat a few hundred names, the defaults among them
+    popular = DEFAULT_CATEGORIES + unique[:500]
+    repeated = [random.choice(popular) for _ in range(count)]
+    legacy_sample = unique[: max(count // 20, 1)]
+    for name in legacy_sample[:100]:
+        assert category_normalizer(name) == legacy_normalizer(name)
+    category_normalizer.cache_clear()
+    print(f"{count} names")
+    timed(f"legacy ({len(legacy_sample)} sampled)", legacy_normalizer, legacy_sample)
+    timed("memoized, unique names", category_normalizer, unique)
+    category_normalizer.cache_clear()
+    timed("memoized, repeated names", category_normalizer, repeated)
+    print(f"    {category_normalizer.cache_info()}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
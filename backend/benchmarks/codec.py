@@ -0,0 +1,101 @@
+#!/usr/bin/python3
+"""Benchmarks JSON encoding and decoding of typical API payloads.
+
+Compares the stdlib json settings of Starlette's JSONResponse with the
+app codec (orjson when installed) on a page of users, the category list
+and a single cached user, the shapes that dominate responses and cache
+values, then the size and speed of the cache encoding (msgpack, zlib
+above PFT_CACHE_COMPRESS_MIN_BYTES) against plain JSON. No database is
+needed.
+
+Run from the backend directory:
+    python -m benchmarks.codec [iterations]
+"""
+
+import json
+import sys
+from datetime import datetime, timedelta
+from time import perf_counter
+from utils import codec
+from utils.utils import DEFAULT_CATEGORIES
+from uuid import uuid4
+
+
+def user(created_at: datetime) -> dict:
+    return {
+        "username": "Someone",
+        "email": "someone@example.com",
+        "role": "user",
+        "image": None,
+        "id": str(uuid4()),
+        "created_at": created_at.isoformat(),
+        "updated_at": created_at.isoformat(),
+    }
+
+
+def payloads() -> dict:
+    now = datetime.now()
+    users = [user(now - timedelta(minutes=i)) for i in range(100)]
+    categories = [
+        {
+            "name": name,
+            "user_id": None,
+            "id": str(uuid4()),
+            "created_at": now.isoformat(),
+            "updated_at": now.isoformat(),
+        }
+        for name in DEFAULT_CATEGORIES
+    ]
+    return {
+        "user page (100)": {
+            "data": {item["id"]: item for item in users},
+            "next_cursor": "WyIyMDI2LTEwLTE4VDIwOjEyOjQ5IiwgImlkIl0",
+        },
+        "categories (24)": {item["id"]: item for item in categories},
+        "cached user": users[0],
+    }
+
+
+def stdlib_dumps(value) -> bytes:
+    """What Starlette's JSONResponse.render does"""
+    return json.dumps(
+        value, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def rate(func, value, iterations: int) -> float:
+    start = perf_counter()
+    for _ in range(iterations):
+        func(value)
+    return iterations / (perf_counter() - start)
+
+
+def main(iterations: int):
+    print(f"codec: {codec.CODEC}")
+    for name, payload in payloads().items():
+        encoded = stdlib_dumps(payload)
+        assert codec.loads(codec.dumps(payload)) == payload
+        print(f"{name}, {len(encoded)} bytes")
+        for label, dumps, loads in (
+            ("stdlib json", stdlib_dumps, json.loads),
+            (codec.CODEC, codec.dumps, codec.loads),
+        ):
+            encode = rate(dumps, payload, iterations)
+            decode = rate(loads, encoded, iterations)
+            print(
+                f"    {label:<14} encode {encode:>10,.0f}/s  decode {decode:>10,.0f}/s"
+            )
+        packed = codec.pack(payload)
+        assert codec.unpack(packed) == payload
+        encode = rate(codec.pack, payload, iterations)
+        decode = rate(codec.unpack, packed, iterations)
+        label = f"cache {codec.CACHE_ENCODING}"
+        print(
+            f"    {label:<14} encode {encode:>10,.0f}/s  decode {decode:>10,.0f}/s",
+            end="",
+        )
+        print(f"  {len(packed)} bytes")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20_000)
@@ -0,0 +1,72 @@
+#!/usr/bin/python3
+"""Measures how a login flood affects the latency of unrelated requests.
+
+A ticker stands in for a cheap endpoint and records how late the event
+loop runs it while a burst of bcrypt verifications is in flight, first
+inline on the loop and then through the bounded PasswordHasher pool.
+
+Run from the backend directory: python -m benchmarks.login_flood [logins]
+"""
+import asyncio
+import sys
+from bcrypt import checkpw
+from time import perf_counter
+from utils.errors import ServiceUnavailable
+from utils.hashing import PasswordHasher
+from utils.utils import hash_password
+
+PASSWORD = "abc12345"
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct))]
+
+
+async def ticker(delays: list[float], stop: asyncio.Event):
+    """Sleeps 5 ms at a time and records how late each wake-up is"""
+    while not stop.is_set():
+        start = perf_counter()
+        await asyncio.sleep(0.005)
+        delays.append((perf_counter() - start - 0.005) * 1000)
+
+
+async def flood(logins: int, verify) -> tuple[list[float], float, int]:
+    delays = []
+    stop = asyncio.Event()
+    task = asyncio.create_task(ticker(delays, stop))
+    hashed = hash_password(PASSWORD)
+    rejected = 0
+
+    async def login():
+        nonlocal rejected
+        try:
+            await verify(PASSWORD, hashed)
+        except ServiceUnavailable:
+            rejected += 1
+
+    start = perf_counter()
+    await asyncio.gather(*(login() for _ in range(logins)))
+    elapsed = perf_counter() - start
+    stop.set()
+    await task
+    return delays, elapsed, rejected
+
+
+async def main(logins: int):
+    async def inline(password, hashed):
+        return checkpw(password.encode("utf-8"), hashed.encode("utf-8"))
+
+    hasher = PasswordHasher(workers=4, max_queue=64)
+    for name, verify in (("inline", inline), ("pool", hasher.verify)):
+        delays, elapsed, rejected = await flood(logins, verify)
+        print(
+            f"{name:>6}: {logins} logins in {elapsed:.2f}s, rejected {rejected}, "
+            f"unrelated request delay p50 {percentile(delays, 0.5):.1f} ms "
+            f"p99 {percentile(delays, 0.99):.1f} ms max {max(delays):.1f} ms"
+        )
+    hasher.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 100))
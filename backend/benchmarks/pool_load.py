@@ -0,0 +1,67 @@
+#!/usr/bin/python3
+"""Load test showing that DB pool checkouts stay bounded under concurrency.
+
+Fires concurrent authenticated GET /users requests at the app in-process
+while sampling the pool. Needs the same MySQL and Redis environment as
+the app, plus an admin account.
+
+Run from the backend directory:
+    pip install -e ".[bench]"
+    python -m benchmarks.pool_load <email> <password> [requests] [concurrency]
+"""
+import asyncio
+import httpx
+import sys
+from app import app
+from storage.db import POOL_MAX_OVERFLOW, POOL_SIZE, connection_leaks, pool_stats
+
+
+async def main(email: str, password: str, requests: int, concurrency: int):
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://pft") as c:
+            r = await c.post("/login", data={"username": email, "password": password})
+            headers = {"Authorization": f"Bearer {r.json()['token']}"}
+            peak = 0
+            done = asyncio.Event()
+
+            async def sample():
+                nonlocal peak
+                while not done.is_set():
+                    peak = max(peak, pool_stats()["checked_out"])
+                    await asyncio.sleep(0.001)
+
+            semaphore = asyncio.Semaphore(concurrency)
+            statuses = {}
+
+            async def hit():
+                async with semaphore:
+                    r = await c.get("/users", headers=headers)
+                    statuses[r.status_code] = statuses.get(r.status_code, 0) + 1
+
+            sampler = asyncio.create_task(sample())
+            await asyncio.gather(*(hit() for _ in range(requests)))
+            done.set()
+            await sampler
+
+    stats = pool_stats()
+    print(f"responses: {statuses}")
+    print(f"peak checked out: {peak} (limit {POOL_SIZE + POOL_MAX_OVERFLOW})")
+    print(f"checked out after run: {stats['checked_out']}")
+    print(f"pool waits: {stats['waits']}, max wait: {stats['max_wait_ms']} ms")
+    leaks = connection_leaks(threshold=0)
+    print(f"unreturned connections: {len(leaks)}")
+    if peak > POOL_SIZE + POOL_MAX_OVERFLOW or stats["checked_out"] or leaks:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    asyncio.run(
+        main(
+            args[0],
+            args[1],
+            int(args[2]) if len(args) > 2 else 2000,
+            int(args[3]) if len(args) > 3 else 200,
+        )
+    )
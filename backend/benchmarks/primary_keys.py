@@ -0,0 +1,105 @@
+#!/usr/bin/python3
+"""Benchmarks inserts keyed by uuid4 text against UUIDv7 BINARY(16) keys.
+
+Fills two scratch tables shaped like expenses, one with the old String(50)
+uuid4 primary key and one with utils.ids keys, and prints the insert rate
+every tenth of the load. Random text keys land all over the clustered
+index, so their rate falls as the table outgrows the buffer pool, while
+time-ordered keys keep appending to its last page. Needs the app's MySQL
+environment; the tables are dropped at the end unless --keep is given.
+
+Run from the backend directory:
+    python -m benchmarks.primary_keys [rows] [--keep]
+"""
+import random
+import sys
+from datetime import datetime
+from sqlalchemy import Column, DateTime, Float, MetaData, String, Table, text
+from storage.db import engine
+from time import perf_counter
+from utils.ids import BinaryId, new_id
+from uuid import uuid4
+
+BATCH_SIZE = 10_000
+USERS = 1000
+
+metadata = MetaData()
+
+
+def scratch_table(name: str, key_type) -> Table:
+    return Table(
+        name,
+        metadata,
+        Column("id", key_type, primary_key=True),
+        Column("user_id", key_type, nullable=False),
+        Column("amount", Float, nullable=False),
+        Column("timestamp", DateTime),
+    )
+
+
+TABLES = {
+    "uuid4 String(50)": (
+        scratch_table("bench_keys_text", String(50)),
+        lambda: str(uuid4()),
+    ),
+    "uuid7 BINARY(16)": (scratch_table("bench_keys_binary", BinaryId), new_id),
+}
+
+
+def table_bytes(name: str):
+    """Data plus index size of a MySQL table, None on other databases"""
+    if engine.dialect.name != "mysql":
+        return None
+    with engine.connect() as conn:
+        return conn.execute(
+            text(
+                "SELECT data_length + index_length FROM information_schema.tables"
+                " WHERE table_schema = DATABASE() AND table_name = :name"
+            ),
+            {"name": name},
+        ).scalar()
+
+
+def load(table: Table, make_id, rows: int, user_ids: list) -> float:
+    now = datetime.now()
+    step = max(rows // 10, BATCH_SIZE)
+    start = last = perf_counter()
+    for offset in range(0, rows, BATCH_SIZE):
+        batch = [
+            {
+                "id": make_id(),
+                "user_id": random.choice(user_ids),
+                "amount": 9.5,
+                "timestamp": now,
+            }
+            for _ in range(min(BATCH_SIZE, rows - offset))
+        ]
+        with engine.begin() as conn:
+            conn.execute(table.insert(), batch)
+        done = offset + len(batch)
+        if done % step == 0 or done == rows:
+            rate = (done % step or step) / (perf_counter() - last)
+            print(f"    {done:>12,} rows  {rate:>10,.0f} rows/s")
+            last = perf_counter()
+    return perf_counter() - start
+
+
+def main(rows: int, keep: bool):
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+    user_ids = [str(uuid4()) for _ in range(USERS)]
+    try:
+        for label, (table, make_id) in TABLES.items():
+            print(f"{label}, {rows:,} rows")
+            seconds = load(table, make_id, rows, user_ids)
+            size = table_bytes(table.name)
+            size = f", {size / 2**20:,.0f} MiB" if size else ""
+            print(f"    total {seconds:.1f}s, {rows / seconds:,.0f} rows/s{size}")
+    finally:
+        if not keep:
+            metadata.drop_all(engine)
+
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if arg != "--keep"]
+    main(int(args[0]) if args else 10_000_000, "--keep" in sys.argv)
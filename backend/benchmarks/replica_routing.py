@@ -0,0 +1,109 @@
+#!/usr/bin/python3
+"""Checks which database each statement of a session is sent to.
+
+Without PFT_REPLICA_URLS set, two SQLite files in the working directory
+stand in for the replicas. Every statement is recorded with the engine
+that ran it, then the routing decisions are checked: reads of read-only
+sessions spread over the replicas, other sessions stay on the primary, a
+flush pins the rest of the session to the primary, and lagging replicas
+are skipped. Needs the app's database environment for the primary; the
+rows written there are rolled back.
+
+Run from the backend directory:
+    pip install -e ".[bench]"
+    python -m benchmarks.replica_routing
+    PFT_REPLICA_STRATEGY=least_connections python -m benchmarks.replica_routing
+"""
+import asyncio
+from os import environ
+
+environ.setdefault(
+    "PFT_REPLICA_URLS",
+    "sqlite+aiosqlite:///replica-1.db,sqlite+aiosqlite:///replica-2.db",
+)
+
+from models import category, user
+from sqlalchemy import event, text
+from storage.db import (
+    REPLICA_MAX_LAG,
+    REPLICA_STRATEGY,
+    check_replicas,
+    dispose_engines,
+    get_async_engine,
+    get_async_sessionmaker,
+    get_replica_engines,
+    replica_lags,
+    session_scope,
+)
+
+routed = []
+
+
+def record(name: str, engine):
+    """Appends name to routed for every statement the engine runs"""
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, *args):
+        routed.append(name)
+
+
+async def route(read_only: bool, statements: int = 1) -> list[str]:
+    """Runs SELECTs in one session and returns where they went"""
+    routed.clear()
+    async with session_scope(read_only=read_only) as db:
+        for _ in range(statements):
+            await db.execute(text("SELECT 2"))
+    return list(routed)
+
+
+def check(label: str, got, expected):
+    print(f"{'ok  ' if got == expected else 'FAIL'} {label}: {got}")
+    if got != expected:
+        raise SystemExit(f"expected {expected}")
+
+
+async def main():
+    record("primary", get_async_engine())
+    replicas = get_replica_engines()
+    for index, replica in enumerate(replicas, 1):
+        record(f"replica-{index}", replica)
+    if len(replicas) != 2:
+        raise SystemExit("PFT_REPLICA_URLS should list two replicas")
+    try:
+        check("before any lag check", await route(True), ["primary"])
+        await check_replicas()
+        check("lag of the stand-ins", dict(replica_lags), {0: 0.0, 1: 0.0})
+        check("read-write session", await route(False, 2), ["primary"] * 2)
+        check("one replica per session", len(set(await route(True, 3))), 1)
+        if REPLICA_STRATEGY == "least_connections":
+            async with replicas[0].connect():
+                spread = [(await route(True))[0] for _ in range(4)]
+            check("least connections, replica-1 busy", spread, ["replica-2"] * 4)
+        else:
+            spread = sorted([(await route(True))[0] for _ in range(4)])
+            check("round robin", spread, ["replica-1"] * 2 + ["replica-2"] * 2)
+
+        routed.clear()
+        async with get_async_sessionmaker()(info={"read_only": True}) as db:
+            await db.execute(text("SELECT 2"))
+            db.add(category.Category(name="Replica routing check"))
+            await db.flush()
+            await db.execute(text("SELECT 2"))
+            await db.rollback()
+        check(
+            "read, flush, read",
+            [routed[0][:7]] + routed[1:],
+            ["replica", "primary", "primary"],
+        )
+
+        replica_lags[0] = REPLICA_MAX_LAG + 1
+        spread = [(await route(True))[0] for _ in range(4)]
+        check("replica-1 lagging", spread, ["replica-2"] * 4)
+        replica_lags[1] = None
+        check("no replica usable", await route(True), ["primary"])
+    finally:
+        await dispose_engines()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
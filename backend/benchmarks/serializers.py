@@ -0,0 +1,75 @@
+#!/usr/bin/python3
+"""Microbenchmarks the model serializers against the old model_to_dict.
+
+Serializes in-memory Expense and User objects with the old reflective
+function, the precompiled per-model serializer, and the rows path that
+skips ORM objects. No database is needed.
+
+Run from the backend directory:
+    python -m benchmarks.serializers [objects]
+"""
+import sys
+from datetime import datetime
+from models.expense import Expense
+from models.user import User
+from sqlalchemy.inspection import inspect
+from time import perf_counter
+from utils.serializers import serializer_for
+from uuid import uuid4
+
+
+def legacy_model_to_dict(obj):
+    """model_to_dict as it was before the serializer registry"""
+    data = {}
+    for model in inspect(obj).mapper.column_attrs:
+        value = getattr(obj, model.key)
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        data[model.key] = value
+    data.pop("password", None)
+    data.pop("is_deleted", None)
+    data.pop("deleted_by", None)
+    return data
+
+
+def make(model, count: int) -> list:
+    now = datetime.now()
+    # every column set, as on objects loaded from the database
+    if model is User:
+        fields = {"username": "someone", "email": "a@b.com", "password": "x" * 60}
+        fields.update(role="user", deleted_by=None, image=None)
+    else:
+        fields = {"category_id": str(uuid4()), "amount": 950, "timestamp": now}
+        fields.update(user_id=str(uuid4()), description=None, currency="NGN")
+    return [
+        model(id=str(uuid4()), created_at=now, updated_at=now, is_deleted=False, **fields)
+        for _ in range(count)
+    ]
+
+
+def timed(label: str, func, count: int):
+    start = perf_counter()
+    func()
+    seconds = perf_counter() - start
+    print(f"    {label:<32} {seconds * 1e6 / count:7.2f} us/object")
+
+
+def main(count: int):
+    for model in (Expense, User):
+        objs = make(model, count)
+        serializer = serializer_for(model)
+        rows = [tuple(getattr(obj, key) for key in serializer.keys) for obj in objs]
+        # same fields; amounts differ, the legacy function sent minor units
+        assert serializer.to_dict(objs[0]).keys() == legacy_model_to_dict(objs[0]).keys()
+        print(f"{model.__name__}, {count} objects")
+        timed(
+            "legacy model_to_dict",
+            lambda: {obj.id: legacy_model_to_dict(obj) for obj in objs},
+            count,
+        )
+        timed("serializer, ORM objects", lambda: serializer.many_to_dict(objs), count)
+        timed("serializer, rows", lambda: serializer.rows_to_dict(rows), count)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
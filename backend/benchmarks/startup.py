@@ -0,0 +1,77 @@
+#!/usr/bin/python3
+"""Benchmarks how long a worker takes to come up and answer.
+
+Starts fresh interpreters that import the app, run its startup handlers
+(seeding the default categories among them) and send GET / in-process,
+and prints the median of each phase plus the wall time from spawning the
+process to the first response. Importing storage.db on its own is timed
+too, it should not touch the database. Needs the same MySQL and Redis
+environment as the app, with the schema created by
+`python -m storage.migrations upgrade`.
+
+Run from the backend directory:
+    python -m benchmarks.startup [runs]
+"""
+import asyncio
+import json
+import subprocess
+import sys
+from statistics import median
+from time import perf_counter
+
+PHASES = ["import storage.db", "import app", "startup", "first request"]
+
+
+async def child():
+    """Times each phase in this process and prints them as JSON"""
+    times = {}
+    start = perf_counter()
+    import storage.db
+
+    times["import storage.db"] = perf_counter() - start
+    start = perf_counter()
+    import httpx
+    from app import app
+
+    times["import app"] = perf_counter() - start
+    start = perf_counter()
+    async with app.router.lifespan_context(app):
+        times["startup"] = perf_counter() - start
+        start = perf_counter()
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://pft") as c:
+            response = await c.get("/")
+        response.raise_for_status()
+        times["first request"] = perf_counter() - start
+        # printed before shutdown, the parent stops its clock on this line
+        print(json.dumps(times), flush=True)
+    await storage.db.get_async_engine().dispose()
+
+
+def main(runs: int):
+    results = {phase: [] for phase in PHASES + ["spawn to response"]}
+    for _ in range(runs):
+        start = perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.startup", "--child"],
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        line = process.stdout.readline()
+        elapsed = perf_counter() - start
+        process.wait()
+        if process.returncode:
+            sys.exit(f"startup run failed with exit code {process.returncode}")
+        for phase, seconds in json.loads(line).items():
+            results[phase].append(seconds)
+        results["spawn to response"].append(elapsed)
+    print(f"median of {runs} runs")
+    for phase, times in results.items():
+        print(f"    {phase:<20} {median(times) * 1000:>9.1f} ms")
+
+
+if __name__ == "__main__":
+    if "--child" in sys.argv:
+        asyncio.run(child())
+    else:
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
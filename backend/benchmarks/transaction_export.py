@@ -0,0 +1,40 @@
+#!/usr/bin/python3
+"""Benchmarks the streaming transaction export.
+
+Drains export_transactions for an existing user, as the route would, and
+reports throughput and peak memory. Peak RSS should not grow with the
+size of the user's history (compare against a user with few rows).
+
+Run from the backend directory:
+    python -m benchmarks.transaction_export <user_id> [csv|ndjson] [--gzip]
+"""
+import asyncio
+import resource
+import sys
+from crud.transactions import export_transactions
+from models.expense import Expense
+from storage.db import async_engine
+from time import perf_counter
+
+
+async def main(user_id: str, fmt: str, compress: bool):
+    start = perf_counter()
+    size = 0
+    lines = 0
+    async for chunk in export_transactions(Expense, user_id, fmt, compress):
+        size += len(chunk)
+        lines += chunk.count(b"\n")
+    seconds = perf_counter() - start
+    await async_engine.dispose()
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    rows = f"{lines} lines" if not compress else "gzipped"
+    print(
+        f"{size / 1e6:.1f} MB ({rows}) in {seconds:.2f}s, "
+        f"{size / 1e6 / seconds:.1f} MB/s, peak RSS {peak_mb:.0f} MB"
+    )
+
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if arg != "--gzip"]
+    fmt = args[1] if len(args) > 1 else "csv"
+    asyncio.run(main(args[0], fmt, "--gzip" in sys.argv))
@@ -0,0 +1,63 @@
+#!/usr/bin/python3
+"""Benchmarks the bulk transaction import on a generated file.
+
+Writes a CSV of synthetic expenses, then runs import_transactions on it
+inside one session, reporting rows per second and peak memory. Needs the
+app's MySQL environment and an existing user id. The import is rolled
+back at the end unless --commit is given.
+
+Run from the backend directory:
+    python -m benchmarks.transaction_import <user_id> [rows] [--commit]
+"""
+import asyncio
+import csv
+import random
+import resource
+import sys
+import tempfile
+from crud.transactions import get_category_ids, import_transactions
+from datetime import datetime, timedelta
+from fastapi import UploadFile
+from models.expense import Expense
+from storage.db import AsyncSessionLocal, async_engine
+
+
+def write_csv(path: str, rows: int, category_ids: list[str]):
+    start = datetime(2020, 1, 1)
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["amount", "category_id", "description", "timestamp"])
+        for i in range(rows):
+            writer.writerow(
+                [
+                    round(random.uniform(1, 500), 2),
+                    random.choice(category_ids),
+                    f"synthetic expense {i}",
+                    (start + timedelta(minutes=i)).isoformat(),
+                ]
+            )
+
+
+async def main(user_id: str, rows: int, commit: bool):
+    async with AsyncSessionLocal() as db:
+        category_ids = sorted(await get_category_ids(db, user_id))
+        with tempfile.NamedTemporaryFile(suffix=".csv") as tmp:
+            write_csv(tmp.name, rows, category_ids)
+            with open(tmp.name, "rb") as f:
+                report = await import_transactions(
+                    db, Expense, user_id, UploadFile(f, filename="bench.csv"), "csv"
+                )
+        await (db.commit() if commit else db.rollback())
+    await async_engine.dispose()
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(
+        f"{report['inserted']} rows inserted, {report['rejected']} rejected "
+        f"in {report['seconds']}s: {report['rows_per_second']} rows/s, "
+        f"peak RSS {peak_mb:.0f} MB"
+    )
+
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if arg != "--commit"]
+    rows = int(args[1]) if len(args) > 1 else 1_000_000
+    asyncio.run(main(args[0], rows, "--commit" in sys.argv))
@@ -0,0 +1,138 @@
+#!/usr/bin/python3
+"""Benchmarks the composite indexes of the transaction tables.
+
+Loads synthetic expenses into a scratch copy of the expenses table that has
+only the single column user_id index the foreign key used to give us, then
+times the hot queries and prints their plans before and after adding the
+composite indexes declared on Expense. Needs the app's MySQL environment;
+the scratch table is dropped at the end unless --keep is given.
+
+Run from the backend directory:
+    python -m benchmarks.transaction_indexes [rows] [users] [--keep]
+"""
+import random
+import statistics
+import sys
+from datetime import datetime, timedelta
+from models.expense import Expense
+from sqlalchemy import Column, Index, MetaData, Table, func, select
+from storage.db import engine
+from time import perf_counter
+from uuid import uuid4
+
+CATEGORIES = 30
+BATCH_SIZE = 20_000
+SAMPLES = 200
+START = datetime(2022, 1, 1)
+DAYS = 3 * 365
+
+metadata = MetaData()
+table = Table(
+    "bench_expenses",
+    metadata,
+    *[
+        Column(column.name, column.type, primary_key=column.primary_key)
+        for column in Expense.__table__.columns
+    ],
+    Index("ix_bench_expenses_user_id", "user_id"),
+)
+
+
+def load(rows: int, user_ids: list[str], category_ids: list[str]):
+    start = perf_counter()
+    with engine.begin() as conn:
+        for offset in range(0, rows, BATCH_SIZE):
+            batch = [
+                {
+                    "id": str(uuid4()),
+                    "user_id": random.choice(user_ids),
+                    "category_id": random.choice(category_ids),
+                    "amount": random.randrange(100, 50_000),  # minor units
+                    "description": None,
+                    "timestamp": START
+                    + timedelta(seconds=random.randrange(DAYS * 86400)),
+                    "is_deleted": random.random() < 0.05,
+                }
+                for _ in range(min(BATCH_SIZE, rows - offset))
+            ]
+            conn.execute(table.insert(), batch)
+    print(f"Loaded {rows} rows in {perf_counter() - start:.1f}s")
+
+
+def queries(user_id: str, category_id: str) -> dict:
+    """The queries behind listings, monthly totals and category reports"""
+    month = START + timedelta(days=30 * random.randrange(DAYS // 30))
+    month_end = month + timedelta(days=30)
+    live = [table.c.user_id == user_id, table.c.is_deleted == False]
+    return {
+        "first page": select(table)
+        .where(*live)
+        .order_by(table.c.timestamp.desc(), table.c.id.desc())
+        .limit(20),
+        "month total": select(func.sum(table.c.amount)).where(
+            *live, table.c.timestamp >= month, table.c.timestamp < month_end
+        ),
+        "category month": select(func.sum(table.c.amount)).where(
+            table.c.user_id == user_id,
+            table.c.category_id == category_id,
+            table.c.timestamp >= month,
+            table.c.timestamp < month_end,
+        ),
+    }
+
+
+def explain(conn, query) -> list:
+    compiled = query.compile(engine)
+    prefix = "EXPLAIN QUERY PLAN " if engine.dialect.name == "sqlite" else "EXPLAIN "
+    params = compiled.params
+    if compiled.positional:
+        params = tuple(params[name] for name in compiled.positiontup)
+    return conn.exec_driver_sql(prefix + str(compiled), params).all()
+
+
+def measure(label: str, user_ids: list[str], category_ids: list[str]):
+    print(f"\n== {label}")
+    timings = {}
+    with engine.connect() as conn:
+        for name, query in queries(user_ids[0], category_ids[0]).items():
+            print(f"{name} plan:")
+            for row in explain(conn, query):
+                print(f"    {tuple(row)}")
+        for _ in range(SAMPLES):
+            sample = queries(random.choice(user_ids), random.choice(category_ids))
+            for name, query in sample.items():
+                start = perf_counter()
+                conn.execute(query).all()
+                timings.setdefault(name, []).append(perf_counter() - start)
+    for name, times in timings.items():
+        times.sort()
+        print(
+            f"{name:>15}: median {statistics.median(times) * 1000:8.2f} ms, "
+            f"p95 {times[int(len(times) * 0.95)] * 1000:8.2f} ms"
+        )
+
+
+def main(rows: int, users: int, keep: bool):
+    user_ids = [str(uuid4()) for _ in range(users)]
+    category_ids = [str(uuid4()) for _ in range(CATEGORIES)]
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+    try:
+        load(rows, user_ids, category_ids)
+        measure("user_id index only", user_ids, category_ids)
+        start = perf_counter()
+        for index in Expense.__table__.indexes:
+            columns = [table.c[column.name] for column in index.columns]
+            Index(index.name.replace("ix_", "ix_bench_"), *columns).create(engine)
+        print(f"\nBuilt composite indexes in {perf_counter() - start:.1f}s")
+        measure("composite indexes", user_ids, category_ids)
+    finally:
+        if not keep:
+            metadata.drop_all(engine)
+
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if arg != "--keep"]
+    rows = int(args[0]) if args else 10_000_000
+    users = int(args[1]) if len(args) > 1 else 10_000
+    main(rows, users, "--keep" in sys.argv)
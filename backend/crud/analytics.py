@@ -0,0 +1,204 @@
+from crud.budgets import period_end, period_start
+from datetime import date, datetime, timedelta
+from models.category import Category
+from models.expense import Expense
+from models.income import Income
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from utils.money import DEFAULT_CURRENCY, to_major
+from utils.utils import sort_dict_by_values
+
+TRANSACTION_MODELS = {"expenses": Expense, "incomes": Income}
+INTERVALS = ("day", "week", "month")
+# most buckets a time series may have
+MAX_SERIES_POINTS = 1000
+
+
+def live_rows(model, user_id: str, start: datetime, end: datetime) -> list:
+    """Filters served by the (user_id, is_deleted, timestamp) index"""
+    return [
+        model.user_id == user_id,
+        model.is_deleted == False,
+        model.timestamp >= start,
+        model.timestamp < end,
+    ]
+
+
+async def daily_totals(
+    db: AsyncSession, model, user_id: str, start: datetime, end: datetime
+) -> dict:
+    """Returns {currency: {day: total}} of a user's transactions in minor
+    units. The database does the grouping and the exact integer sums, so only
+    one row per currency and day with activity comes back"""
+    day = func.date(model.timestamp)
+    rows = await db.execute(
+        select(model.currency, day, func.sum(model.amount))
+        .where(*live_rows(model, user_id, start, end))
+        .group_by(model.currency, day)
+    )
+    totals = {}
+    for currency, spent_on, amount in rows:
+        if isinstance(spent_on, str):
+            spent_on = date.fromisoformat(spent_on)
+        day_start = datetime(spent_on.year, spent_on.month, spent_on.day)
+        totals.setdefault(currency, {})[day_start] = amount
+    return totals
+
+
+def bucket_starts(interval: str, start: datetime, end: datetime) -> list:
+    """Every bucket start from the one containing `start` up to `end`"""
+    period = "weekly" if interval == "week" else "monthly"
+    bucket = start.replace(hour=0, minute=0, second=0, microsecond=0)
+    if interval != "day":
+        bucket = period_start(period, bucket)
+    starts = []
+    while bucket < end:
+        starts.append(bucket)
+        if interval == "day":
+            bucket += timedelta(days=1)
+        else:
+            bucket = period_end(period, bucket)
+    return starts
+
+
+def fold(totals: dict, interval: str) -> dict:
+    """Folds daily totals into weekly or monthly ones"""
+    if interval == "day":
+        return totals
+    period = "weekly" if interval == "week" else "monthly"
+    folded = {}
+    for day, amount in totals.items():
+        bucket = period_start(period, day)
+        folded[bucket] = folded.get(bucket, 0) + amount
+    return folded
+
+
+async def series_totals(
+    db: AsyncSession, user_id: str, interval: str, start: datetime, end: datetime
+) -> dict:
+    """{currency: [(bucket start, expenses, incomes)]} in minor units per day,
+    week or month, gaps filled with 0. Amounts in different currencies are
+    never added up; without any transaction the default currency is used"""
+    buckets = bucket_starts(interval, start, end)
+    if len(buckets) > MAX_SERIES_POINTS:
+        raise ValueError(f"Range too long for a {interval} series")
+    daily = {
+        kind: await daily_totals(db, model, user_id, start, end)
+        for kind, model in TRANSACTION_MODELS.items()
+    }
+    currencies = sorted(set(daily["expenses"]) | set(daily["incomes"]))
+    series = {}
+    for currency in currencies or [DEFAULT_CURRENCY]:
+        expenses = fold(daily["expenses"].get(currency, {}), interval)
+        incomes = fold(daily["incomes"].get(currency, {}), interval)
+        series[currency] = [
+            (bucket, expenses.get(bucket, 0), incomes.get(bucket, 0))
+            for bucket in buckets
+        ]
+    return series
+
+
+async def get_time_series(
+    db: AsyncSession, user_id: str, interval: str, start: datetime, end: datetime
+) -> dict:
+    """Expenses, incomes and net per currency and day, week or month, gaps
+    filled with 0"""
+    series = await series_totals(db, user_id, interval, start, end)
+    return {
+        currency: [
+            {
+                "period": bucket.isoformat(),
+                "expenses": to_major(expenses),
+                "incomes": to_major(incomes),
+                "net": to_major(incomes - expenses),
+            }
+            for bucket, expenses, incomes in points
+        ]
+        for currency, points in series.items()
+    }
+
+
+async def get_month_over_month(db: AsyncSession, user_id: str, months: int) -> dict:
+    """Monthly totals per currency of the last `months` months with the
+    change from the month before, as an amount and a percentage"""
+    end = period_end("monthly", period_start("monthly", datetime.now()))
+    start = end
+    for _ in range(months + 1):
+        start = period_start("monthly", start - timedelta(days=1))
+    series = await series_totals(db, user_id, "month", start, end)
+    return {currency: changes(points) for currency, points in series.items()}
+
+
+def changes(series: list) -> list:
+    """Rows of a monthly series with the change from the month before"""
+    output = []
+    for previous, current in zip(series, series[1:]):
+        row = {
+            "period": current[0].isoformat(),
+            "expenses": to_major(current[1]),
+            "incomes": to_major(current[2]),
+            "net": to_major(current[2] - current[1]),
+        }
+        for index, kind in ((1, "expenses"), (2, "incomes")):
+            change = current[index] - previous[index]
+            row[f"{kind}_change"] = to_major(change)
+            row[f"{kind}_change_pct"] = (
+                round(change / previous[index] * 100, 1) if previous[index] else None
+            )
+        output.append(row)
+    return output
+
+
+async def get_category_breakdown(
+    db: AsyncSession,
+    user_id: str,
+    kind: str,
+    start: datetime,
+    end: datetime,
+    top: int = None,
+) -> dict:
+    """Totals per currency and category, largest first, with each one's
+    share of its currency's total"""
+    model = TRANSACTION_MODELS[kind]
+    rows = await db.execute(
+        select(model.currency, model.category_id, func.sum(model.amount), func.count())
+        .where(*live_rows(model, user_id, start, end))
+        .group_by(model.currency, model.category_id)
+    )
+    totals = {}
+    counts = {}
+    for currency, category_id, amount, count in rows:
+        totals.setdefault(currency, {})[category_id] = amount
+        counts[(currency, category_id)] = count
+    ranked = {
+        currency: list(sort_dict_by_values(amounts).items())[:top]
+        for currency, amounts in sorted(totals.items())
+    }
+    category_ids = {
+        category_id for categories in ranked.values() for category_id, _ in categories
+    }
+    names = dict(
+        (
+            await db.execute(
+                select(Category.id, Category.name).where(Category.id.in_(category_ids))
+            )
+        ).all()
+    )
+    breakdown = {}
+    for currency, categories in ranked.items():
+        # integer minor units: the parts add up to the total exactly
+        total = sum(totals[currency].values())
+        breakdown[currency] = {
+            "total": to_major(total),
+            "categories": [
+                {
+                    "category_id": category_id,
+                    "name": names.get(category_id),
+                    "total": to_major(amount),
+                    "count": counts[(currency, category_id)],
+                    "share": round(amount / total * 100, 1) if total else 0,
+                }
+                for category_id, amount in categories
+            ],
+        }
+    return breakdown or {DEFAULT_CURRENCY: {"total": 0, "categories": []}}
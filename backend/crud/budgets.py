@@ -0,0 +1,347 @@
+import redis.exceptions
+from datetime import date, datetime, timedelta
+from models.category import Category
+from models.budget import Budget, BudgetPeriod, BudgetSpend
+from models.expense import Expense
+from sqlalchemy import and_, delete, func, or_, select
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from storage.db import after_commit, session_scope
+from storage.redis import redis_cache
+from utils.money import DEFAULT_CURRENCY, to_major
+from utils.utils import create_budget_spend_key, model_to_dict, users_to_dict
+
+PERIODS = [period.value for period in BudgetPeriod]
+# rollup rows written per statement
+SPEND_BATCH_SIZE = 1000
+
+# Copies new rollup totals to a cached period hash, but only if no other write
+# to the period bumped its generation since this one did. Writes bump while
+# holding the rollup row locks, in commit order, so a write that bumped later
+# has newer totals: the hash is dropped rather than set back to older ones.
+# A missing hash is loaded whole from the rollup on next read; the generation
+# is bumped again so that a refill which read the rollup before the commit
+# does not cache it.
+# KEYS: generation key, period hash. ARGV: generation the write bumped the
+# key to, then the field and new total of each category and currency.
+MIRROR_SPEND_SCRIPT = """
+if (redis.call('GET', KEYS[1]) or '') ~= ARGV[1] then
+    redis.call('DEL', KEYS[2])
+    return 0
+end
+if redis.call('EXISTS', KEYS[2]) == 1 then
+    redis.call('HSET', KEYS[2], unpack(ARGV, 2))
+end
+redis.call('INCR', KEYS[1])
+return 1
+"""
+mirror_spend_script = redis_cache.r.register_script(MIRROR_SPEND_SCRIPT)
+
+
+def period_start(period: str, when: datetime) -> datetime:
+    """Returns the start of the weekly (from Monday) or monthly period"""
+    day = datetime(when.year, when.month, when.day)
+    if period == BudgetPeriod.weekly.value:
+        return day - timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+
+def period_end(period: str, start: datetime) -> datetime:
+    """Returns the start of the period after the one starting at `start`"""
+    if period == BudgetPeriod.weekly.value:
+        return start + timedelta(days=7)
+    return (start + timedelta(days=32)).replace(day=1)
+
+
+def spend_time(expense) -> datetime:
+    """The time an expense counts against a budget"""
+    return expense.timestamp or expense.created_at or datetime.now()
+
+
+def spend_field(category_id: str, currency: str) -> str:
+    """Field of a category's total in one currency in a cached period hash"""
+    return f"{category_id}:{currency}"
+
+
+def add_spend(
+    deltas: dict, category_id: str, currency: str, when: datetime, amount: int
+):
+    """Adds an amount in minor units to the (category, currency, period,
+    start) deltas of every period. Currencies are never added together"""
+    for period in PERIODS:
+        key = (category_id, currency, period, period_start(period, when))
+        deltas[key] = deltas.get(key, 0) + amount
+
+
+def upsert_statement(db: AsyncSession, rows: list[dict]):
+    """INSERT ... ON DUPLICATE KEY UPDATE total = total + new total.
+    SQLite's ON CONFLICT form is used for local runs"""
+    if db.bind.dialect.name == "sqlite":
+        statement = sqlite_insert(BudgetSpend).values(rows)
+        return statement.on_conflict_do_update(
+            index_elements=[
+                column.name for column in BudgetSpend.__table__.primary_key
+            ],
+            set_={"total": BudgetSpend.total + statement.excluded.total},
+        )
+    statement = mysql_insert(BudgetSpend).values(rows)
+    return statement.on_duplicate_key_update(
+        total=BudgetSpend.total + statement.inserted.total
+    )
+
+
+async def apply_spend(db: AsyncSession, user_id: str, deltas: dict):
+    """Adds the deltas to the rollup with upserts and, after the commit,
+    copies the new totals to the cached period hashes"""
+    keys = [key for key, amount in deltas.items() if amount]
+    totals = []
+    for offset in range(0, len(keys), SPEND_BATCH_SIZE):
+        chunk = keys[offset : offset + SPEND_BATCH_SIZE]
+        rows = [
+            {
+                "user_id": user_id,
+                "category_id": category_id,
+                "currency": currency,
+                "period": period,
+                "period_start": start,
+                "total": deltas[(category_id, currency, period, start)],
+            }
+            for category_id, currency, period, start in chunk
+        ]
+        await db.execute(upsert_statement(db, rows))
+        # the upsert holds the row locks, so these are the totals being committed
+        result = await db.execute(
+            select(
+                BudgetSpend.category_id,
+                BudgetSpend.currency,
+                BudgetSpend.period,
+                BudgetSpend.period_start,
+                BudgetSpend.total,
+            ).where(
+                BudgetSpend.user_id == user_id,
+                or_(
+                    *[
+                        and_(
+                            BudgetSpend.category_id == category_id,
+                            BudgetSpend.currency == currency,
+                            BudgetSpend.period == period,
+                            BudgetSpend.period_start == start,
+                        )
+                        for category_id, currency, period, start in chunk
+                    ]
+                ),
+            )
+        )
+        totals.extend(result.all())
+    if not totals:
+        return
+    fields = {}
+    for category_id, currency, period, start, total in totals:
+        key = create_budget_spend_key(user_id, period, start)
+        fields.setdefault(key, []).extend([spend_field(category_id, currency), total])
+    # bumped before the commit, while the row locks order the writes
+    generations = await redis_cache.bump_generations(list(fields))
+    after_commit(db, lambda: mirror_spend(fields, generations))
+
+
+async def mirror_spend(fields: dict, generations: list):
+    """Writes new rollup totals {key: [field, total, ...]} to the cached
+    period hashes, or drops those a later write has bumped since"""
+    try:
+        async with redis_cache.r.pipeline(transaction=False) as pipe:
+            for key, generation in zip(fields, generations or [None] * len(fields)):
+                if generation is None:
+                    pipe.delete(key)
+                    continue
+                await mirror_spend_script(
+                    keys=[redis_cache.generation_key(key), key],
+                    args=[generation, *fields[key]],
+                    client=pipe,
+                )
+            await pipe.execute()
+    except redis.exceptions.ConnectionError as e:
+        print(f"Redis Connection Error: {e}")
+
+
+async def get_spend(user_id: str, period: str, start: datetime):
+    """Returns {spend_field: total} of a user's period, from Redis when cached.
+    A miss loads the period's rows from the rollup table by primary key, in
+    its own session so that the long-lived hash is filled from the primary
+    and never from a replica serving the request"""
+    key = create_budget_spend_key(user_id, period, start)
+    cached = await redis_cache.get_hash(key)
+    if cached is not None:
+        cached.pop("_", None)
+        return {field: int(total) for field, total in cached.items()}
+    # read before the rollup, a write committed after it skips the refill
+    generations = await redis_cache.generations([key])
+    async with session_scope() as db:
+        rows = await db.execute(
+            select(
+                BudgetSpend.category_id, BudgetSpend.currency, BudgetSpend.total
+            ).where(
+                BudgetSpend.user_id == user_id,
+                BudgetSpend.period == period,
+                BudgetSpend.period_start == start,
+            )
+        )
+        spend = {
+            spend_field(category_id, currency): total
+            for category_id, currency, total in rows
+        }
+    # "_" keeps the hash alive when nothing has been spent yet
+    ttl = (period_end(period, start) - datetime.now()).total_seconds() + 86400
+    await redis_cache.set_hash(
+        key, {"_": 0, **spend}, max(int(ttl), 60), generations and generations[0]
+    )
+    return spend
+
+
+async def rebuild_budget_spend(db: AsyncSession) -> int:
+    """Recomputes the whole rollup from the expenses table in one pass.
+    SQL sums each user's spending per category and day; the days are then
+    folded into weeks and months here"""
+    day = func.date(func.coalesce(Expense.timestamp, Expense.created_at))
+    result = await db.stream(
+        select(
+            Expense.user_id,
+            Expense.category_id,
+            Expense.currency,
+            day,
+            func.sum(Expense.amount),
+        )
+        .where(Expense.is_deleted == False)
+        .group_by(Expense.user_id, Expense.category_id, Expense.currency, day)
+    )
+    totals = {}
+    async for user_id, category_id, currency, spent_on, amount in result:
+        if isinstance(spent_on, str):
+            spent_on = date.fromisoformat(spent_on)
+        for period in PERIODS:
+            start = period_start(period, spent_on)
+            key = (user_id, category_id, currency, period, start)
+            totals[key] = totals.get(key, 0) + amount
+    await db.execute(delete(BudgetSpend))
+    rows = [
+        {
+            "user_id": user_id,
+            "category_id": category_id,
+            "currency": currency,
+            "period": period,
+            "period_start": start,
+            "total": total,
+        }
+        for (user_id, category_id, currency, period, start), total in totals.items()
+    ]
+    for offset in range(0, len(rows), SPEND_BATCH_SIZE):
+        await db.execute(
+            BudgetSpend.__table__.insert(), rows[offset : offset + SPEND_BATCH_SIZE]
+        )
+    after_commit(db, clear_spend_mirror)
+    return len(rows)
+
+
+async def clear_spend_mirror():
+    """Drops every cached period hash, they refill from the rollup on read"""
+    try:
+        keys = [key async for key in redis_cache.r.scan_iter("BudgetSpend:*")]
+        for offset in range(0, len(keys), 1000):
+            await redis_cache.r.delete(*keys[offset : offset + 1000])
+    except redis.exceptions.ConnectionError as e:
+        print(f"Redis Connection Error: {e}")
+
+
+async def create_budget(db: AsyncSession, user_id: str, data: dict):
+    """Creates a budget, one per category and period for each user"""
+    category = await db.scalar(
+        select(Category.id).where(
+            Category.id == data["category_id"],
+            or_(Category.user_id == None, Category.user_id == user_id),
+        )
+    )
+    if not category:
+        raise ValueError(f"category {data['category_id']} does not exist")
+    existing = await db.scalar(
+        select(Budget.id).where(
+            Budget.user_id == user_id,
+            Budget.category_id == data["category_id"],
+            Budget.period == data["period"],
+            Budget.is_deleted == False,
+        )
+    )
+    if existing:
+        raise ValueError("A budget already exists for this category and period")
+    data["currency"] = data.get("currency") or DEFAULT_CURRENCY
+    budget = Budget(user_id=user_id, **data)
+    db.add(budget)
+    await db.flush()
+    await db.refresh(budget)
+    return model_to_dict(budget)
+
+
+async def get_budget(db: AsyncSession, user_id: str, budget_id: str):
+    """Returns one of a user's active budgets"""
+    return await db.scalar(
+        select(Budget).where(
+            Budget.id == budget_id,
+            Budget.user_id == user_id,
+            Budget.is_deleted == False,
+        )
+    )
+
+
+async def get_budgets(db: AsyncSession, user_id: str):
+    """Returns a user's budgets with what is left of each this period.
+    One cached hash read per period, whatever the number of budgets"""
+    budgets = (
+        await db.scalars(
+            select(Budget).where(Budget.user_id == user_id, Budget.is_deleted == False)
+        )
+    ).all()
+    if not budgets:
+        return None
+    now = datetime.now()
+    spend = {}
+    for period in {budget.period for budget in budgets}:
+        spend[period] = await get_spend(user_id, period, period_start(period, now))
+    output = users_to_dict(budgets)
+    for budget in budgets:
+        field = spend_field(budget.category_id, budget.currency)
+        spent = spend[budget.period].get(field, 0)
+        output[budget.id].update(budget_status(budget, spent, now))
+    return output
+
+
+async def get_budget_remaining(db: AsyncSession, user_id: str, budget_id: str):
+    """Returns what is left of a budget in the current period"""
+    budget = await get_budget(db, user_id, budget_id)
+    if not budget:
+        return None
+    now = datetime.now()
+    spend = await get_spend(user_id, budget.period, period_start(budget.period, now))
+    field = spend_field(budget.category_id, budget.currency)
+    status = budget_status(budget, spend.get(field, 0), now)
+    return {"id": budget.id, "category_id": budget.category_id, **status}
+
+
+def budget_status(budget: Budget, spent: int, now: datetime) -> dict:
+    """Spent and remaining amounts of a budget in the period containing now.
+    Both are worked out in minor units, exactly, then sent as currency units"""
+    start = period_start(budget.period, now)
+    return {
+        "period_start": start.isoformat(),
+        "period_end": period_end(budget.period, start).isoformat(),
+        "spent": to_major(spent),
+        "remaining": to_major(budget.amount_limit - spent),
+    }
+
+
+async def delete_budget(db: AsyncSession, user_id: str, budget_id: str) -> int:
+    """Soft deletes one of a user's budgets"""
+    budget = await get_budget(db, user_id, budget_id)
+    if not budget:
+        return 0
+    budget.is_deleted = True
+    await db.flush()
+    return 1
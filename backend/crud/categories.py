@@ -1,67 +1,224 @@
-from ast import mod
-from backend.routes import categories
+import redis.exceptions
 from models.category import Category
-from sqlalchemy.orm import Session
-from storage.db import SessionLocal
-from storage.redis import RedisCache, redis_cache
-from models.user import User
+from sqlalchemy import func, insert, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from storage.db import after_commit, get_async_engine, session_scope
+from storage.redis import redis_cache
+from storage.singleflight import single_flight
+from utils.ids import new_id
 from utils.utils import (
-    create_category_key,
-    create_user_key,
+    DEFAULT_CATEGORIES,
+    category_normalizer,
+    create_categories_key,
+    create_category_names_key,
     model_to_dict,
     users_to_dict,
-    hash_password,
 )
 
-indexes = {
-    "categories": "idx:Category",
-}
+# Adds or removes a name only in name sets that are loaded, a partial set
+# would make missing names look free
+UPDATE_NAMES_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call(ARGV[1], KEYS[1], ARGV[2])
+end
+"""
+update_names_script = redis_cache.r.register_script(UPDATE_NAMES_SCRIPT)
+# keeps loaded sets non-empty, never a normalized name
+NAMES_SENTINEL = "_"
+# MySQL named lock taken by the worker seeding the default categories
+SEED_LOCK = "pft_seed_default_categories"
+SEED_LOCK_TIMEOUT = 30
 
 
-async def create_a_category(name: str, user_id: str = None):
-    """This creates a new category in the DB"""
-    db = SessionLocal()
+async def load_category_names(db: AsyncSession, user_id: str) -> tuple:
+    """Fills the name sets of the default and the user's categories"""
+    keys = [create_category_names_key(), create_category_names_key(user_id)]
+    # read before the query, names added or removed after it skip the refill
+    generations = await redis_cache.generations(keys)
+    rows = await db.execute(
+        select(Category.name, Category.user_id).where(
+            or_(Category.user_id == None, Category.user_id == user_id)
+        )
+    )
+    default, own = {NAMES_SENTINEL}, {NAMES_SENTINEL}
+    for name, owner in rows:
+        (own if owner else default).add(category_normalizer(name))
+    await redis_cache.set_members({keys[0]: default, keys[1]: own}, generations)
+    return default, own
+
+
+async def category_name_exists(db: AsyncSession, name: str, user_id: str) -> bool:
+    """Checks a name against the default and the user's categories with two
+    set lookups, reading the database only to load missing sets"""
+    name = category_normalizer(name)
+    keys = (create_category_names_key(), create_category_names_key(user_id))
+    try:
+        async with redis_cache.r.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.exists(key)
+                pipe.sismember(key, name)
+            default_loaded, in_default, own_loaded, in_own = await pipe.execute()
+        if default_loaded and own_loaded:
+            return bool(in_default or in_own)
+    except redis.exceptions.ConnectionError as e:
+        print(f"Redis Connection Error: {e}")
+    default, own = await load_category_names(db, user_id)
+    return name in default or name in own
+
+
+async def update_category_names(command: str, name: str, user_id: str = None):
+    """Adds (SADD) or removes (SREM) a name in a loaded name set. The
+    generation is bumped first, so that a reload which read the DB before
+    the commit is dropped"""
+    await redis_cache.bump_generations([create_category_names_key(user_id)])
+    try:
+        await update_names_script(
+            keys=[create_category_names_key(user_id)],
+            args=[command, category_normalizer(name)],
+            client=redis_cache.r,
+        )
+    except redis.exceptions.ConnectionError as e:
+        print(f"Redis Connection Error: {e}")
+
+
+async def create_a_category(db: AsyncSession, name: str, user_id: str = None):
+    """This creates a new category in the DB.
+    Raises ValueError if the user already sees a category of that name"""
+    if await category_name_exists(db, name, user_id):
+        raise ValueError(f"Category {name} already exists")
     try:
         category = Category(name=name, user_id=user_id)
         db.add(category)
-        db.commit()
+        await db.flush()
+        await db.refresh(category)
         category = model_to_dict(category)
-        db.close()
-        await redis_cache.set(
-            key=create_category_key(category_id=category["id"]),
-            value=category,
-            indexes=[indexes["categories"]],
-        )
+        after_commit(db, lambda: add_to_catalog(user_id, category))
+        after_commit(db, lambda: update_category_names("SADD", name, user_id))
         return category
     except Exception as e:
         raise ValueError(f"Couldn't save category: {e}")
 
 
-async def delete_a_category(category_id: str):
+async def add_to_catalog(user_id: str, category: dict):
+    """Adds a new category to its cached catalog. The generation is bumped
+    first, so that a refill which read the DB before the commit is dropped"""
+    key = create_categories_key(user_id)
+    await redis_cache.bump_generations([key])
+    await redis_cache.set_record(key, category["id"], category)
+
+
+async def remove_from_catalog(user_id: str, category_id: str):
+    """Removes a deleted category from its cached catalog"""
+    key = create_categories_key(user_id)
+    await redis_cache.bump_generations([key])
+    await redis_cache.delete_record(key, category_id)
+
+
+async def delete_a_category(db: AsyncSession, category_id: str):
     """This deletes a category"""
-    db = SessionLocal()
     try:
-        category = db.query(Category).filter(Category.id == category_id).first()
+        category = await db.get(Category, category_id)
         if not category:
             return 0
-        db.delete(category)
-        await redis_cache.delete(
-            create_category_key(category_id=category.id), index=indexes["categories"]
-        )
-        db.commit()
-        db.close()
+        name, user_id = category.name, category.user_id
+        await db.delete(category)
+        after_commit(db, lambda: remove_from_catalog(user_id, category_id))
+        after_commit(db, lambda: update_category_names("SREM", name, user_id))
         return 1
     except Exception as e:
         raise ValueError(f"Couldn't save category: {e}")
 
 
-async def get_all_categories():
-    """This returns all the categories in the db"""
-    categories = await redis_cache.get_index([indexes["categories"]])
-    if categories:
-        return categories
-    db = SessionLocal()
-    categories = db.query(Category).all()
-    if not categories:
-        return None
-    return users_to_dict(categories)
+async def refill_categories(user_id: str) -> tuple:
+    """Loads the default and the user's categories in one query and caches
+    both catalogs in one pipelined write"""
+    keys = [create_categories_key(), create_categories_key(user_id)]
+    # read before the query, writes committed after it skip the refill
+    generations = await redis_cache.generations(keys)
+    async with session_scope() as db:
+        categories = await db.scalars(
+            select(Category).where(
+                or_(Category.user_id == None, Category.user_id == user_id)
+            )
+        )
+        default, own = [], []
+        for category in categories:
+            (own if category.user_id else default).append(category)
+        default, own = users_to_dict(default), users_to_dict(own)
+    await redis_cache.set_records({keys[0]: default, keys[1]: own}, generations)
+    return default, own
+
+
+async def prime_default_categories():
+    """Caches the default catalog, which every user's category reads need"""
+    key = create_categories_key()
+    generations = await redis_cache.generations([key])
+    async with session_scope() as db:
+        categories = await db.scalars(select(Category).where(Category.user_id == None))
+        default = users_to_dict(categories.all())
+    await redis_cache.set_records({key: default}, generations)
+
+
+async def get_all_categories(db: AsyncSession, user_id: str):
+    """Returns the default categories and the user's own as {id: category},
+    from two cached hashes read in one round trip"""
+    keys = [create_categories_key(), create_categories_key(user_id)]
+
+    async def lookup():
+        catalogs = await redis_cache.get_records(keys)
+        return None if None in catalogs else catalogs
+
+    catalogs = await lookup()
+    if catalogs is None:
+        # concurrent misses share one refill
+        catalogs = await single_flight(
+            keys[1], lambda: refill_categories(user_id), lookup
+        )
+    categories = {}
+    for catalog in catalogs:
+        categories.update(catalog)
+    return categories or None
+
+
+async def seed_default_categories() -> int:
+    """Adds the default categories missing from the DB with one SELECT and
+    one bulk INSERT. On MySQL, workers starting together take turns under a
+    named lock held until the insert commits, so later ones find the rows
+    and insert nothing. Returns the number of categories added"""
+    async with get_async_engine().connect() as conn:
+        locking = conn.dialect.name == "mysql"
+        if locking:
+            locked = await conn.scalar(
+                select(func.get_lock(SEED_LOCK, SEED_LOCK_TIMEOUT))
+            )
+            await conn.commit()
+            if not locked:
+                raise RuntimeError("Timed out waiting to seed default categories")
+        try:
+            async with conn.begin():
+                existing = set(
+                    await conn.scalars(
+                        select(Category.name).where(
+                            Category.user_id == None,
+                            Category.name.in_(DEFAULT_CATEGORIES),
+                        )
+                    )
+                )
+                rows = [
+                    {"id": new_id(), "name": name, "user_id": None}
+                    for name in DEFAULT_CATEGORIES
+                    if name not in existing
+                ]
+                if rows:
+                    await conn.execute(insert(Category), rows)
+        finally:
+            if locking:
+                await conn.scalar(select(func.release_lock(SEED_LOCK)))
+                await conn.commit()
+    if rows:
+        # cached catalogs and name sets of the defaults are now incomplete
+        keys = [create_categories_key(), create_category_names_key()]
+        await redis_cache.bump_generations(keys)
+        for key in keys:
+            await redis_cache.delete(key)
+    return len(rows)
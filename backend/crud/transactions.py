@@ -0,0 +1,299 @@
+from crud.budgets import add_spend, apply_spend, spend_time
+from datetime import datetime
+import csv
+import io
+import zlib
+from fastapi.concurrency import run_in_threadpool
+from itertools import islice
+from models.category import Category
+from models.expense import Expense
+from os import environ
+from pydantic import ValidationError
+from schemas.transactionschema import TransactionExpected
+from sqlalchemy import insert, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from storage.db import session_scope
+from time import perf_counter
+from utils import codec
+from utils.ids import new_id
+from utils.ingest import iter_records
+from utils.money import DEFAULT_CURRENCY
+from utils.pagination import cached_total, paginate
+from utils.serializers import compile_row_serializer, serializer_for
+from utils.utils import model_to_dict
+
+IMPORT_BATCH_SIZE = int(environ.get("PFT_IMPORT_BATCH_SIZE", 1000))
+# number of rejected rows described in an import report
+IMPORT_MAX_ERRORS = 50
+IMPORT_FIELDS = ("amount", "currency", "category_id", "description", "timestamp")
+EXPORT_BATCH_SIZE = int(environ.get("PFT_EXPORT_BATCH_SIZE", 1000))
+EXPORT_FIELDS = (
+    "id",
+    "timestamp",
+    "amount",
+    "currency",
+    "category_id",
+    "description",
+)
+
+
+async def get_category_ids(db: AsyncSession, user_id: str) -> set:
+    """Returns the ids of the categories a user can file transactions under"""
+    rows = await db.scalars(
+        select(Category.id).where(
+            or_(Category.user_id == None, Category.user_id == user_id)
+        )
+    )
+    return set(rows.all())
+
+
+def validate_transaction(model, data: dict, category_ids: set) -> dict:
+    """Checks the category rules of a transaction, returns the row to save"""
+    category_id = data.get("category_id")
+    if model is Expense and not category_id:
+        raise ValueError("category_id is required for expenses")
+    if category_id and category_id not in category_ids:
+        raise ValueError(f"category {category_id} does not exist")
+    if not data.get("timestamp"):
+        data["timestamp"] = datetime.now()
+    if not data.get("currency"):
+        data["currency"] = DEFAULT_CURRENCY
+    return data
+
+
+async def create_transaction(db: AsyncSession, model, user_id: str, data: dict):
+    """Creates an expense or an income for a user"""
+    category_ids = await get_category_ids(db, user_id)
+    data = validate_transaction(model, data, category_ids)
+    transaction = model(user_id=user_id, **data)
+    db.add(transaction)
+    await db.flush()
+    await db.refresh(transaction)
+    if model is Expense:
+        deltas = {}
+        add_spend(
+            deltas,
+            transaction.category_id,
+            transaction.currency,
+            spend_time(transaction),
+            data["amount"],
+        )
+        await apply_spend(db, user_id, deltas)
+    return model_to_dict(transaction)
+
+
+async def get_transactions(
+    db: AsyncSession,
+    model,
+    user_id: str,
+    limit: int,
+    cursor: str = None,
+    include_total: bool = False,
+):
+    """Returns a page of a user's expenses or incomes, most recent first"""
+    serializer = serializer_for(model)
+    query = serializer.select().where(
+        model.user_id == user_id, model.is_deleted == False
+    )
+    transactions, next_cursor = await paginate(
+        db, query, model, limit, cursor, sort_column=model.timestamp
+    )
+    if not transactions:
+        return None
+    page = {"data": serializer.rows_to_dict(transactions), "next_cursor": next_cursor}
+    if include_total:
+        key = f"Count:{model.__tablename__}:{user_id}"
+        page["total"] = await cached_total(db, query, key)
+    return page
+
+
+async def update_transaction(
+    db: AsyncSession, model, user_id: str, transaction_id: str, updates: dict
+):
+    """Updates one of a user's expenses or incomes"""
+    transaction = await db.scalar(
+        select(model).where(
+            model.id == transaction_id,
+            model.user_id == user_id,
+            model.is_deleted == False,
+        )
+    )
+    if not transaction:
+        return None
+    if "category_id" in updates:
+        # only the category is checked, validate_transaction would also
+        # default the timestamp and currency of the row
+        category_id = updates["category_id"]
+        if model is Expense and not category_id:
+            raise ValueError("category_id is required for expenses")
+        if category_id and category_id not in await get_category_ids(db, user_id):
+            raise ValueError(f"category {category_id} does not exist")
+    deltas = {}
+    if model is Expense:
+        # move the old amount out of its periods, the new one in below
+        add_spend(
+            deltas,
+            transaction.category_id,
+            transaction.currency,
+            spend_time(transaction),
+            -transaction.amount,
+        )
+    for key, value in updates.items():
+        setattr(transaction, key, value)
+    await db.flush()
+    await db.refresh(transaction)
+    if model is Expense:
+        add_spend(
+            deltas,
+            transaction.category_id,
+            transaction.currency,
+            spend_time(transaction),
+            transaction.amount,
+        )
+        await apply_spend(db, user_id, deltas)
+    return model_to_dict(transaction)
+
+
+async def delete_transaction(
+    db: AsyncSession, model, user_id: str, transaction_id: str
+) -> int:
+    """Soft deletes one of a user's expenses or incomes"""
+    transaction = await db.scalar(
+        select(model).where(
+            model.id == transaction_id,
+            model.user_id == user_id,
+            model.is_deleted == False,
+        )
+    )
+    if not transaction:
+        return 0
+    transaction.is_deleted = True
+    await db.flush()
+    if model is Expense:
+        deltas = {}
+        add_spend(
+            deltas,
+            transaction.category_id,
+            transaction.currency,
+            spend_time(transaction),
+            -transaction.amount,
+        )
+        await apply_spend(db, user_id, deltas)
+    return 1
+
+
+def read_batch(records, model, user_id: str, category_ids: set) -> tuple:
+    """Parses and validates the next IMPORT_BATCH_SIZE records of an upload.
+    Returns the valid rows and the (line, error) of the rejected ones, both
+    empty at the end of the file. Blocking: run it in the threadpool"""
+    rows = []
+    rejects = []
+    for line_number, record in islice(records, IMPORT_BATCH_SIZE):
+        try:
+            if not isinstance(record, dict):
+                raise ValueError("row is not a valid record")
+            data = TransactionExpected.model_validate(
+                {key: record.get(key) or None for key in IMPORT_FIELDS}
+            ).model_dump()
+            data = validate_transaction(model, data, category_ids)
+        except ValidationError as e:
+            message = "; ".join(
+                f"{error['loc'][0]}: {error['msg']}" for error in e.errors()
+            )
+            rejects.append((line_number, message))
+            continue
+        except ValueError as e:
+            rejects.append((line_number, str(e)))
+            continue
+        data["id"] = new_id()
+        data["user_id"] = user_id
+        rows.append(data)
+    return rows, rejects
+
+
+async def import_transactions(db: AsyncSession, model, user_id: str, file, fmt: str):
+    """Streams rows out of an uploaded file and inserts them in batches.
+    Each batch is parsed and validated in the threadpool, off the event loop.
+    Invalid rows are skipped and reported; the whole import is one transaction"""
+    start = perf_counter()
+    category_ids = await get_category_ids(db, user_id)
+    statement = insert(model)
+    records = iter_records(file, fmt)
+    deltas = {}
+    inserted = 0
+    rejected = 0
+    errors = []
+    while True:
+        rows, rejects = await run_in_threadpool(
+            read_batch, records, model, user_id, category_ids
+        )
+        if not rows and not rejects:
+            break
+        rejected += len(rejects)
+        for line_number, message in rejects[: IMPORT_MAX_ERRORS - len(errors)]:
+            errors.append({"line": line_number, "error": message})
+        if not rows:
+            continue
+        if model is Expense:
+            for data in rows:
+                add_spend(
+                    deltas,
+                    data["category_id"],
+                    data["currency"],
+                    data["timestamp"],
+                    data["amount"],
+                )
+        # executemany, sent as multi-row INSERTs by the driver
+        await db.execute(statement, rows)
+        inserted += len(rows)
+    await apply_spend(db, user_id, deltas)
+    seconds = perf_counter() - start
+    return {
+        "inserted": inserted,
+        "rejected": rejected,
+        "errors": errors,
+        "seconds": round(seconds, 3),
+        "rows_per_second": round((inserted + rejected) / seconds) if seconds else 0,
+    }
+
+
+async def export_transactions(model, user_id: str, fmt: str, compress: bool = False):
+    """Streams a user's whole history of expenses or incomes as CSV or NDJSON
+    chunks, optionally gzipped. Rows come off a server-side cursor one batch
+    at a time, so memory stays flat however long the history is.
+    Opens its own session: it runs after the request's session has closed"""
+    columns = [model.__table__.c[field] for field in EXPORT_FIELDS]
+    serialize = compile_row_serializer(columns)
+    gzip = zlib.compressobj(wbits=31) if compress else None
+    query = (
+        select(*columns)
+        .where(model.user_id == user_id, model.is_deleted == False)
+        .order_by(model.timestamp, model.id)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+    async with session_scope() as db:
+        result = await db.stream(query)
+        if fmt == "csv":
+            header = encode_csv([EXPORT_FIELDS])
+            yield gzip.compress(header) if gzip else header
+        async for rows in result.partitions():
+            values = [serialize(row) for row in rows]
+            if fmt == "csv":
+                chunk = encode_csv(values)
+            else:
+                chunk = b"".join(
+                    codec.dumps(dict(zip(EXPORT_FIELDS, row))) + b"\n" for row in values
+                )
+            if gzip:
+                chunk = gzip.compress(chunk)
+            if chunk:
+                yield chunk
+    if gzip:
+        yield gzip.flush()
+
+
+def encode_csv(rows: list) -> bytes:
+    """Writes rows as CSV lines"""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue().encode("utf-8")
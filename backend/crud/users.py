@@ -1,24 +1,38 @@
+from os import environ
 from uuid import uuid4
-from sqlalchemy.orm import Session
-from storage.db import SessionLocal
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from storage.db import after_commit, session_scope
 from storage.redis import redis_cache
+from storage.singleflight import cached
+from models.archive import ARCHIVES
 from models.user import User
-from utils.utils import create_user_key, model_to_dict, users_to_dict, hash_password
+from utils.hashing import password_hasher
+from utils.pagination import cached_total, paginate
+from utils.serializers import serializer_for
+from utils.utils import (
+    create_principal_key,
+    create_user_key,
+    model_to_dict,
+)
 
+PRINCIPAL_TTL = int(environ.get("PFT_PRINCIPAL_TTL", 300))
+# cached users are served this long past their TTL while being refreshed
+USER_STALE_TTL = int(environ.get("PFT_USER_STALE_TTL", 60))
 
-async def create_user(name: str, email: str, password: str):
+
+async def create_user(db: AsyncSession, name: str, email: str, password: str):
     """Creates a new user in the DB"""
-    db = SessionLocal()
-    user = get_user_by_email(email=email)
+    user = await get_user_by_email(db, email=email)
     if user:
         return None
     # check if this is the first account being created
-    user: db.query(User).first()
+    user = await db.scalar(select(User.id).limit(1))
     role = "user"
     if not user:
         role = "superuser"
     # validate and hash the password
-    hashed_password = hash_password(password)
+    hashed_password = await password_hasher.hash(password)
     # Save the user
     user = User(
         username=name,
@@ -27,98 +41,141 @@ async def create_user(name: str, email: str, password: str):
         role=role,
     )
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.flush()
+    await db.refresh(user)
     user = model_to_dict(user)
-    await redis_cache.set(key=create_user_key(user["id"]), value=user)
+    after_commit(db, lambda: load_user.prime(user, user["id"]))
     return user
 
 
-def get_user_by_email(email: str):
+async def get_user_by_email(db: AsyncSession, email: str):
     """Gets a user by searching with the email"""
-    db = SessionLocal()
-    user = db.query(User).filter(User.email == email, User.is_deleted == False).first()
-    if user:
-        return user
-    return None
+    return await db.scalar(
+        select(User).where(User.email == email, User.is_deleted == False)
+    )
+
+
+@cached(create_user_key, stale_ttl=USER_STALE_TTL)
+async def load_user(user_id: str):
+    """Loads an active user, once for concurrent cache misses"""
+    async with session_scope() as db:
+        user = await db.scalar(
+            select(User).where(User.id == user_id, User.is_deleted == False)
+        )
+        return model_to_dict(user) if user else None
 
 
-async def get_user_by_id(db: Session, user_id: str):
+async def get_user_by_id(db: AsyncSession, user_id: str):
     """Gets a user by searching with the id"""
-    key = create_user_key(user_id)
-    cached_info = redis_cache.get(key=key)
-    if cached_info:
-        return cached_info
-    user = db.query(User).filter(User.id == user_id, User.is_deleted == False).first()
-    if user:
-        user = model_to_dict(user)
-        await redis_cache.set(key=key, value=user)
-        return user
-    return None
+    return await load_user(user_id)
+
+
+async def get_principal(user_id: str):
+    """Returns the id and role of an active user, cached for a short time"""
+    key = create_principal_key(user_id)
+    principal = await redis_cache.get(key)
+    if principal:
+        return principal
+    # read before the DB, a write committed after it skips the refill
+    generations = await redis_cache.generations([key])
+    async with session_scope() as db:
+        row = (
+            await db.execute(
+                select(User.id, User.role).where(
+                    User.id == user_id, User.is_deleted == False
+                )
+            )
+        ).first()
+    if not row:
+        return None
+    principal = {"id": row.id, "role": row.role}
+    await redis_cache.fill(
+        key, principal, PRINCIPAL_TTL, generations and generations[0]
+    )
+    return principal
 
 
-async def update_user(user_id: str, updates: dict):
+async def invalidate_principal(user_id: str):
+    """Drops a cached principal so the next request reloads it, and keeps
+    loads that read the DB before the change from caching it again"""
+    key = create_principal_key(user_id)
+    await redis_cache.bump_generations([key])
+    await redis_cache.delete(key)
+
+
+async def update_user(db: AsyncSession, user_id: str, updates: dict):
     """This updates a user's information in the DB"""
-    db = SessionLocal()
-    user = db.query(User).filter(User.id == user_id, User.is_deleted == False).first()
+    user = await db.scalar(
+        select(User).where(User.id == user_id, User.is_deleted == False)
+    )
     if not user:
         return None
     for key, value in updates.items():
         if key == "password":
-            updates["password"] = hash_password(updates["password"])
+            value = await password_hasher.hash(value)
         setattr(user, key, value)
-    db.commit()
-    db.refresh(user)
+    await db.flush()
+    await db.refresh(user)
     user = model_to_dict(user)
-    # Create key for caching the User info
-    # Cache the user info
-    await redis_cache.set(key=create_user_key(user_id), value=user)
+
+    async def refresh_cache():
+        # Cache the user info
+        await load_user.prime(user, user_id)
+        await invalidate_principal(user_id)
+
+    after_commit(db, refresh_cache)
     return user
 
 
-async def delete_a_user(user_id: str, deleter_id: str) -> int:
+async def delete_a_user(db: AsyncSession, user_id: str, deleter_id: str) -> int:
     """This soft_deletes a user from the db"""
-    # Delete the user from redis cache
-    key = create_user_key(user_id)
-    await redis_cache.delete(key)
-
-    # delete the user from the db
-    db = SessionLocal()
     try:
-        user = (
-            db.query(User).filter(User.id == user_id, User.is_deleted == False).first()
+        user = await db.scalar(
+            select(User).where(User.id == user_id, User.is_deleted == False)
         )
         if user:
             user.is_deleted = True
             user.deleted_by = deleter_id
     except Exception as e:
         raise ValueError(f"Error: {e}")
+
+    async def clear_cache():
+        # Delete the user from redis cache
+        await load_user.invalidate(user_id)
+        await invalidate_principal(user_id)
+
+    after_commit(db, clear_cache)
     return 1
 
 
-def delete_a_user_permanently(user_id: str) -> int:
+async def delete_a_user_permanently(db: AsyncSession, user_id: str) -> int:
     """This deletes a user permanently"""
-    db = SessionLocal()
     try:
-        user = db.query(User).filter(User.id == user_id).first()
+        user = await db.get(User, user_id)
         if not user:
             return -1
         if user.is_deleted is not True:
             return 0
-        db.delete(user)
-        db.commit()
+        await db.delete(user)
+        # archive tables have no foreign keys to cascade through
+        for archive in ARCHIVES.values():
+            await db.execute(delete(archive).where(archive.c.user_id == user_id))
     except Exception as e:
         raise ValueError(f"Error: {e}")
+    after_commit(db, lambda: invalidate_principal(user_id))
     return 1
 
 
-def get_users(page: int, limit: int):
-    """This returns all users in the DB using pages"""
-    db = SessionLocal()
-    skip = (page - 1) * limit
-    users = db.query(User).offset(skip).limit(limit).all()
+async def get_users(
+    db: AsyncSession, limit: int, cursor: str = None, include_total: bool = False
+):
+    """This returns the active users in the DB, newest first, a page at a time"""
+    serializer = serializer_for(User)
+    query = serializer.select().where(User.is_deleted == False)
+    users, next_cursor = await paginate(db, query, User, limit, cursor)
     if not users:
         return None
-    total = db.query(User).count()
-    users = users_to_dict(users)
-    return {"total": total, "data": users}
+    page = {"data": serializer.rows_to_dict(users), "next_cursor": next_cursor}
+    if include_total:
+        page["total"] = await cached_total(db, query, "Count:users")
+    return page
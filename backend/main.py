@@ -1,6 +1,49 @@
 #!/usr/bin/python3
-"""Module that starts the FastAPI app"""
+"""Module that starts the FastAPI app
+
+Run from the backend directory:
+    python main.py                development server, reloads on changes
+    python main.py --production   [--workers N] worker processes for traffic
+"""
+import argparse
+import os
 import uvicorn
+from dotenv import load_dotenv
+from importlib.util import find_spec
+from os import environ
+
+load_dotenv()
+
+HOST = environ.get("PFT_APP_HOST", "127.0.0.1")
+APP_PORT = int(environ.get("PFT_APP_PORT", 8000))
+# each worker has its own pool of PFT_POOL_SIZE + PFT_POOL_MAX_OVERFLOW
+# connections, keep the total under the database's max_connections
+WORKERS = int(environ.get("PFT_WORKERS", os.cpu_count() or 1))
+# seconds in-flight requests get to finish once a worker is told to stop
+GRACEFUL_SHUTDOWN = int(environ.get("PFT_GRACEFUL_SHUTDOWN", 30))
+
+
+def production_options(workers: int) -> dict:
+    """uvicorn settings for serving traffic. uvloop and httptools come with
+    the speedups extra, without them uvicorn's asyncio loop and h11 are used"""
+    return {
+        "workers": workers,
+        "loop": "uvloop" if find_spec("uvloop") else "asyncio",
+        "http": "httptools" if find_spec("httptools") else "h11",
+        "timeout_graceful_shutdown": GRACEFUL_SHUTDOWN,
+        "proxy_headers": True,
+    }
+
 
 if __name__ == "__main__":
-    uvicorn.run("app:app", port=8000, reload=True)
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--production", action="store_true")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=APP_PORT)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    args = parser.parse_args()
+    if args.production:
+        options = production_options(args.workers)
+    else:
+        options = {"reload": True}
+    uvicorn.run("app:app", host=args.host, port=args.port, **options)
@@ -1,82 +1,146 @@
-from models.user import User
-from storage.db import SessionLocal
+from crud.users import get_principal
 from storage.redis import redis_cache
 from dotenv import load_dotenv
-from fastapi import Request
-from fastapi.responses import JSONResponse
-from utils.errors import *
+from utils.codec import JSONResponse
 from utils.utils import create_user_token_key
 from jose import JWTError, jwt
 from os import environ
+import re
 
 load_dotenv()
 
+PUBLIC = "public"
+AUTHENTICATED = "authenticated"
+ADMIN = "admin"
 
-async def auth_middleware(request: Request, call_next):
-    """Middleware action to identify authorized logins"""
-    # check if the path does not require authentication
+# paths that do not require authentication. Entries ending in "/" match
+# every path below them, other entries match exactly
+PUBLIC_PATHS = [
+    "/",
+    "/docs",
+    "/docs/oauth2-redirect",
+    "/openapi.json",
+    "/redoc",
+    "/favicon.ico",
+    "/register",
+    "/login",
+    "/healthz",
+    "/readyz",
+    "/static/",
+]
 
-    path_list = [
-        "/",
-        "/docs",
-        "/openapi.json",
-        "/redoc",
-        "/favicon.ico",
-        "/register",
-        "/login",
-    ]
-    if any(request.url.path.startswith(path) for path in path_list):
-        return await call_next(request)
-    # Get authorization header
-    auth_header = request.headers.get("Authorization")
-    if not auth_header or not auth_header.startswith("Bearer "):
-        return JSONResponse(
-            status_code=401, content={"message": "Unauthorized: Not Authenticated"}
-        )
-    token = auth_header.split(" ")[1]
-    # Verify JWT
-    try:
-        payload = jwt.decode(
-            token,
-            environ.get("JWT_SECRET_KEY"),
-            algorithms=[environ.get("JWT_ALGORITHM")],
-        )
-        request.state.user = payload  # store the user's information in the request
-    except JWTError:
-        return JSONResponse(
-            status_code=401, content={"message": "Unauthorized: Invalid Token"}
-        )
+# paths only available to non "user" roles. Entries match the path itself
+# and every path below it
+ADMIN_PATHS = [
+    "/users",
+    "/edit_profile",
+    "/delete_user",
+    "/rm_user_perm",
+    "/metrics",
+]
 
-    user_id = request.state.user["user_id"]
-    # check for logged out accounts
-    key = create_user_token_key(user_id)
-    cached_data = await redis_cache.get(key)
-    if cached_data:
-        return JSONResponse(
-            status_code=401, content={"message": "Unauthorized: Not Authenticated"}
-        )
-    # get user's role
-    """key = create_user_key(user_id)
-    user = await redis_cache.get(key)
-    if user:
-        request.state.role = user["role"]
-    else:"""
-    db = SessionLocal()
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
-        return JSONResponse(
-            status_code=401,
-            content={
-                "message": "Unauthorized: you are not authorized to access this feature"
-            },
-        )
-    request.state.role = user.role
-    # block admin only paths
-    admin_ony_paths = []
-    if any(request.url.path.startswith(path) for path in admin_ony_paths):
-        if user.role == "user":
+
+class RouteTable:
+    """Classifies request paths as public, authenticated or admin only"""
+
+    def __init__(self, public_paths: list[str], admin_paths: list[str]):
+        prefixes = [p for p in public_paths if p.endswith("/") and p != "/"]
+        self.public_exact = frozenset(p for p in public_paths if p not in prefixes)
+        self.public_prefix = self._compile(prefixes, "")
+        self.admin = self._compile(admin_paths, "(?:/|$)")
+
+    @staticmethod
+    def _compile(paths: list[str], suffix: str):
+        """Builds one anchored regex out of a list of paths"""
+        if not paths:
+            return None
+        alternatives = "|".join(re.escape(path) for path in paths)
+        return re.compile(f"(?:{alternatives}){suffix}")
+
+    def classify(self, path: str) -> str:
+        """Returns the access level required for a path"""
+        if path in self.public_exact:
+            return PUBLIC
+        if self.public_prefix and self.public_prefix.match(path):
+            return PUBLIC
+        if self.admin and self.admin.match(path):
+            return ADMIN
+        return AUTHENTICATED
+
+
+class AuthMiddleware:
+    """ASGI middleware to identify authorized logins"""
+
+    def __init__(
+        self,
+        app,
+        public_paths: list[str] = PUBLIC_PATHS,
+        admin_paths: list[str] = ADMIN_PATHS,
+    ):
+        self.app = app
+        self.routes = RouteTable(public_paths, admin_paths)
+        self.secret_key = environ.get("JWT_SECRET_KEY")
+        self.algorithms = [environ.get("JWT_ALGORITHM")]
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        # check if the path does not require authentication
+        access = self.routes.classify(scope["path"])
+        if access == PUBLIC:
+            return await self.app(scope, receive, send)
+        response = await self.authenticate(scope, access)
+        if response:
+            return await response(scope, receive, send)
+        await self.app(scope, receive, send)
+
+    async def authenticate(self, scope, access: str):
+        """Stores the user in the request state, or returns an error response"""
+        # Get authorization header
+        auth_header = None
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                auth_header = value.decode("latin-1")
+                break
+        if not auth_header or not auth_header.startswith("Bearer "):
+            return JSONResponse(
+                status_code=401, content={"message": "Unauthorized: Not Authenticated"}
+            )
+        token = auth_header[7:]
+        # Verify JWT
+        try:
+            payload = jwt.decode(token, self.secret_key, algorithms=self.algorithms)
+        except JWTError:
+            return JSONResponse(
+                status_code=401, content={"message": "Unauthorized: Invalid Token"}
+            )
+
+        user_id = payload.get("user_id")
+        if not user_id:
+            return JSONResponse(
+                status_code=401, content={"message": "Unauthorized: Invalid Token"}
+            )
+        # check for logged out accounts
+        if await redis_cache.get(create_user_token_key(user_id)):
+            return JSONResponse(
+                status_code=401, content={"message": "Unauthorized: Not Authenticated"}
+            )
+        # get user's role
+        user = await get_principal(user_id)
+        if not user:
+            return JSONResponse(
+                status_code=401,
+                content={
+                    "message": "Unauthorized: you are not authorized to access this feature"
+                },
+            )
+        # block admin only paths
+        if access == ADMIN and user["role"] == "user":
             return JSONResponse(
                 status_code=403, content={"message": "Forbidden: Admins Only"}
             )
-        # call the next request
-    return await call_next(request)
+        # store the user's information in the request
+        state = scope.setdefault("state", {})
+        state["user"] = {**payload, "role": user["role"]}
+        state["role"] = user["role"]
+        return None
@@ -0,0 +1,26 @@
+from models.basemodel import Base
+from models.expense import Expense
+from models.income import Income
+from sqlalchemy import Column, DateTime, Index, Table, func
+
+
+def archive_table(model) -> Table:
+    """Creates the archive twin of a transaction table: same columns, no
+    foreign keys, so soft-deleted rows can leave the hot table"""
+    name = f"{model.__tablename__}_archive"
+    columns = [
+        Column(column.name, column.type, primary_key=column.primary_key)
+        for column in model.__table__.columns
+    ]
+    return Table(
+        name,
+        Base.metadata,
+        *columns,
+        Column("archived_at", DateTime, server_default=func.now()),
+        Index(f"ix_{name}_user_timestamp", "user_id", "timestamp"),
+    )
+
+
+expenses_archive = archive_table(Expense)
+incomes_archive = archive_table(Income)
+ARCHIVES = {Expense: expenses_archive, Income: incomes_archive}
@@ -1,7 +1,7 @@
-from sqlalchemy import Column, Integer, String, DateTime, func
+from sqlalchemy import Column, Integer, DateTime, func
 from sqlalchemy.orm import declarative_base
 from datetime import datetime
-from uuid import uuid4
+from utils.ids import BinaryId, new_id
 
 Base = declarative_base()
 
@@ -9,7 +9,7 @@ Base = declarative_base()
 class Basemodel:
 
     __abstract__ = True
-    id = Column(String(50), primary_key=True, default=str(uuid4))
+    id = Column(BinaryId, primary_key=True, default=new_id)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(
         DateTime(timezone=True),
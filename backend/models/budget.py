@@ -1,5 +1,7 @@
 from enum import Enum
 from models.basemodel import Basemodel, Base
+from utils.ids import BinaryId
+from utils.money import DEFAULT_CURRENCY, Money
 from sqlalchemy import (
     Column,
     Integer,
@@ -22,11 +24,31 @@ class Budget(Basemodel, Base):
     __tablename__ = "budgets"
 
     user_id = Column(
-        String(50), ForeignKey("users.id", ondelete="CASCADE"), nullable=False
+        BinaryId, ForeignKey("users.id", ondelete="CASCADE"), nullable=False
     )
     category_id = Column(
-        String(50), ForeignKey("categories.id", ondelete="CASCADE"), nullable=False
+        BinaryId, ForeignKey("categories.id", ondelete="CASCADE"), nullable=False
     )
-    amount_limit = Column(Float, nullable=False)
+    amount_limit = Column(Money, nullable=False)
+    currency = Column(String(3), nullable=False, default=DEFAULT_CURRENCY)
     period = Column(String(10), nullable=False)
     is_deleted = Column(Boolean, default=False)
+
+
+class BudgetSpend(Base):
+    """Running expense total of a user's category in one budget period.
+    Kept up to date on every expense write so budgets never SUM expenses"""
+
+    __tablename__ = "budget_spend"
+
+    user_id = Column(
+        BinaryId, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    period = Column(String(10), primary_key=True)
+    period_start = Column(DateTime, primary_key=True)
+    category_id = Column(
+        BinaryId, ForeignKey("categories.id", ondelete="CASCADE"), primary_key=True
+    )
+    # spend in each currency is kept apart, a budget counts its own currency
+    currency = Column(String(3), primary_key=True, default=DEFAULT_CURRENCY)
+    total = Column(Money, nullable=False, default=0)
@@ -1,4 +1,5 @@
 from models.basemodel import Basemodel, Base
+from utils.ids import BinaryId
 from sqlalchemy import Column, Integer, String, DateTime, Boolean, func, ForeignKey
 
 
@@ -6,5 +7,5 @@ class Category(Basemodel, Base):
     __tablename__ = "categories"
     name = Column(String(50), nullable=False)
     user_id = Column(
-        String(50), ForeignKey("users.id", ondelete="CASCADE"), nullable=True
+        BinaryId, ForeignKey("users.id", ondelete="CASCADE"), nullable=True
     )
@@ -1,4 +1,6 @@
 from models.basemodel import Basemodel, Base
+from utils.ids import BinaryId
+from utils.money import DEFAULT_CURRENCY, Money
 from sqlalchemy import (
     Column,
     Integer,
@@ -7,21 +9,41 @@ from sqlalchemy import (
     Boolean,
     func,
     ForeignKey,
-    Float,
+    Index,
 )
 from datetime import datetime
 
 
 class Expense(Basemodel, Base):
     __tablename__ = "expenses"
+    __table_args__ = (
+        # a user's live rows in (timestamp, id) order: listings page by it
+        # without a sort, and the trailing columns cover the category and
+        # daily totals so SUM(amount) never reads the rows
+        Index(
+            "ix_expenses_user_deleted_timestamp",
+            "user_id",
+            "is_deleted",
+            "timestamp",
+            "id",
+            "category_id",
+            "amount",
+            "currency",
+        ),
+        # a user's rows in one category over time
+        Index(
+            "ix_expenses_user_category_timestamp", "user_id", "category_id", "timestamp"
+        ),
+    )
 
     user_id = Column(
-        String(50), ForeignKey("users.id", ondelete="CASCADE"), nullable=False
+        BinaryId, ForeignKey("users.id", ondelete="CASCADE"), nullable=False
     )
     category_id = Column(
-        String(50), ForeignKey("categories.id", ondelete="CASCADE"), nullable=False
+        BinaryId, ForeignKey("categories.id", ondelete="CASCADE"), nullable=False
     )
-    amount = Column(Float, nullable=False)
+    amount = Column(Money, nullable=False)
+    currency = Column(String(3), nullable=False, default=DEFAULT_CURRENCY)
     description = Column(String(200))
     timestamp = Column(DateTime, nullable=True)
     is_deleted = Column(Boolean, default=False)
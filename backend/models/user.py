@@ -1,16 +1,28 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, func, ForeignKey
+from sqlalchemy import (
+    Column,
+    Integer,
+    String,
+    DateTime,
+    Boolean,
+    func,
+    ForeignKey,
+    Index,
+)
 from models.basemodel import Basemodel, Base
+from utils.ids import BinaryId
 from bcrypt import hashpw, checkpw, gensalt
 
 
 class User(Basemodel, Base):
     __tablename__ = "users"
+    # keyset pagination walks this index newest first
+    __table_args__ = (Index("ix_users_created_at_id", "created_at", "id"),)
     username = Column(String(30), nullable=False)
     email = Column(String(100), unique=True, nullable=False)
     password = Column(String(100), nullable=False)
     role = Column(String(9), default="user")
     is_deleted = Column(Boolean, default=False)
-    deleted_by = Column(String(30), ForeignKey("users.id", ondelete="CASCADE"))
+    deleted_by = Column(BinaryId, ForeignKey("users.id", ondelete="CASCADE"))
     image = Column(String(50))
 
     def is_valid_password(self, password: str) -> bool:
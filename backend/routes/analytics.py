@@ -0,0 +1,77 @@
+from crud.analytics import (
+    INTERVALS,
+    TRANSACTION_MODELS,
+    get_category_breakdown,
+    get_month_over_month,
+    get_time_series,
+)
+from datetime import datetime, timedelta
+from fastapi import APIRouter, Query, Request
+from utils.codec import JSONResponse
+from starlette.status import HTTP_200_OK
+from storage.db import DBSession
+from utils.errors import Bad_Request
+from utils.utils import naive_local
+
+analytics_router = APIRouter(prefix="/analytics")
+
+
+def date_range(start: datetime, end: datetime, default_days: int):
+    """Fills in a missing range end with now and start with `default_days` ago"""
+    start, end = naive_local(start), naive_local(end)
+    end = end or datetime.now()
+    start = start or end - timedelta(days=default_days)
+    if start >= end:
+        raise Bad_Request("start must be before end")
+    return start, end
+
+
+@analytics_router.get("/categories")
+async def category_breakdown(
+    request: Request,
+    db: DBSession,
+    kind: str = Query("expenses", description="expenses or incomes"),
+    start: datetime = None,
+    end: datetime = None,
+    top: int = Query(None, ge=1),
+):
+    """Returns the user's totals per currency and category, largest first"""
+    if kind not in TRANSACTION_MODELS:
+        raise Bad_Request("kind must be expenses or incomes")
+    start, end = date_range(start, end, 30)
+    breakdown = await get_category_breakdown(
+        db, request.state.user["user_id"], kind, start, end, top
+    )
+    return JSONResponse(content=breakdown, status_code=HTTP_200_OK)
+
+
+@analytics_router.get("/timeseries")
+async def time_series(
+    request: Request,
+    db: DBSession,
+    interval: str = Query("day", description="day, week or month"),
+    start: datetime = None,
+    end: datetime = None,
+):
+    """Returns the user's expenses, incomes and net per currency and day,
+    week or month"""
+    if interval not in INTERVALS:
+        raise Bad_Request("interval must be day, week or month")
+    start, end = date_range(start, end, 30)
+    try:
+        series = await get_time_series(
+            db, request.state.user["user_id"], interval, start, end
+        )
+    except ValueError as e:
+        raise Bad_Request(str(e))
+    return JSONResponse(content=series, status_code=HTTP_200_OK)
+
+
+@analytics_router.get("/monthly")
+async def month_over_month(
+    request: Request, db: DBSession, months: int = Query(12, ge=1, le=120)
+):
+    """Returns the user's last months per currency with the change from the
+    month before"""
+    series = await get_month_over_month(db, request.state.user["user_id"], months)
+    return JSONResponse(content=series, status_code=HTTP_200_OK)
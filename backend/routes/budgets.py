@@ -0,0 +1,58 @@
+from crud.budgets import (
+    create_budget,
+    delete_budget,
+    get_budget_remaining,
+    get_budgets,
+)
+from fastapi import APIRouter, Request
+from utils.codec import JSONResponse
+from schemas.budgetschema import BudgetExpected
+from starlette.status import HTTP_201_CREATED, HTTP_200_OK
+from storage.db import DBSession
+from utils.errors import Bad_Request, Not_Found
+
+
+budget_router = APIRouter()
+
+
+@budget_router.post("/budgets")
+async def add_budget(request: Request, budget: BudgetExpected, db: DBSession):
+    """Creates a weekly or monthly budget on one of the user's categories"""
+    data = budget.model_dump()
+    data["period"] = budget.period.value
+    try:
+        budget = await create_budget(db, request.state.user["user_id"], data)
+    except ValueError as e:
+        raise Bad_Request(str(e))
+    return JSONResponse(content=budget, status_code=HTTP_201_CREATED)
+
+
+@budget_router.get("/budgets")
+async def get_all_budgets(request: Request, db: DBSession):
+    """Returns the user's budgets with what is spent and left this period"""
+    budgets = await get_budgets(db, request.state.user["user_id"])
+    if budgets:
+        return JSONResponse(content=budgets, status_code=HTTP_200_OK)
+    raise Not_Found("No budgets found")
+
+
+@budget_router.get("/budgets/{budget_id}/remaining")
+async def budget_remaining(request: Request, budget_id: str, db: DBSession):
+    """Returns what is left of a budget in the current period"""
+    remaining = await get_budget_remaining(
+        db, request.state.user["user_id"], budget_id
+    )
+    if remaining:
+        return JSONResponse(content=remaining, status_code=HTTP_200_OK)
+    raise Not_Found("Budget does not exist")
+
+
+@budget_router.delete("/budgets/{budget_id}")
+async def remove_budget(request: Request, budget_id: str, db: DBSession):
+    """Deletes one of the user's budgets"""
+    success = await delete_budget(db, request.state.user["user_id"], budget_id)
+    if success:
+        return JSONResponse(
+            content="Budget deleted successfully", status_code=HTTP_200_OK
+        )
+    raise Not_Found("Budget does not exist")
@@ -0,0 +1,24 @@
+from fastapi import APIRouter, Request
+from utils.codec import JSONResponse
+from starlette.status import HTTP_200_OK, HTTP_503_SERVICE_UNAVAILABLE
+
+health_router = APIRouter()
+
+
+def probe(ready: bool):
+    """200 when the check passes, 503 otherwise"""
+    status = HTTP_200_OK if ready else HTTP_503_SERVICE_UNAVAILABLE
+    content = {"status": "ok" if ready else "starting"}
+    return JSONResponse(content=content, status_code=status)
+
+
+@health_router.get("/healthz")
+async def liveness(request: Request):
+    """Liveness: the worker finished warming up and its event loop answers"""
+    return probe(request.app.state.warmed_up)
+
+
+@health_router.get("/readyz")
+async def readiness(request: Request):
+    """Readiness: warmed up and not shutting down, so it may take traffic"""
+    return probe(request.app.state.ready)
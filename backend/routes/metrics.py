@@ -0,0 +1,23 @@
+from fastapi import APIRouter
+from utils.codec import CODEC, JSONResponse
+from starlette.status import HTTP_200_OK
+from storage.db import pool_stats
+from storage.redis import redis_cache
+from utils.hashing import password_hasher
+from utils.ratelimit import rate_limiter
+
+
+metrics_router = APIRouter()
+
+
+@metrics_router.get("/metrics")
+async def get_metrics():
+    """Returns runtime counters used for sizing caches and pools"""
+    metrics = {
+        "cache": redis_cache.stats(),
+        "codec": CODEC,
+        "db_pool": pool_stats(),
+        "password_hasher": password_hasher.stats(),
+        "rate_limits": rate_limiter.stats(),
+    }
+    return JSONResponse(content=metrics, status_code=HTTP_200_OK)
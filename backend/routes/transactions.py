@@ -0,0 +1,139 @@
+from crud.transactions import (
+    create_transaction,
+    delete_transaction,
+    export_transactions,
+    get_transactions,
+    import_transactions,
+    update_transaction,
+)
+from fastapi import APIRouter, File, Query, Request, UploadFile
+from fastapi.responses import StreamingResponse
+from models.expense import Expense
+from models.income import Income
+from schemas.transactionschema import TransactionExpected, TransactionUpdate
+from starlette.status import HTTP_201_CREATED, HTTP_200_OK
+from storage.db import DBSession
+from utils.codec import JSONResponse
+from utils.errors import Bad_Request, Not_Found
+from utils.ingest import IMPORT_FORMATS, detect_format
+from utils.pagination import MAX_PAGE_LIMIT
+
+EXPORT_MEDIA_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+
+def create_transaction_router(model, name: str) -> APIRouter:
+    """Builds the create/list/update/delete/import routes of a transaction model.
+    `name` is the plural used in the paths, e.g. "expenses" """
+    router = APIRouter()
+
+    @router.post(f"/{name}")
+    async def create(request: Request, transaction: TransactionExpected, db: DBSession):
+        """Records a transaction for the logged in user"""
+        try:
+            transaction = await create_transaction(
+                db, model, request.state.user["user_id"], transaction.model_dump()
+            )
+        except ValueError as e:
+            raise Bad_Request(str(e))
+        return JSONResponse(content=transaction, status_code=HTTP_201_CREATED)
+
+    @router.get(f"/{name}")
+    async def get_all(
+        request: Request,
+        db: DBSession,
+        cursor: str = Query(None, description="next_cursor of the previous page"),
+        limit: int = Query(20, ge=1, le=MAX_PAGE_LIMIT),
+        include_total: bool = False,
+    ):
+        """Returns the logged in user's transactions, most recent first"""
+        try:
+            transactions = await get_transactions(
+                db,
+                model,
+                request.state.user["user_id"],
+                limit=limit,
+                cursor=cursor,
+                include_total=include_total,
+            )
+        except ValueError as e:
+            raise Bad_Request(str(e))
+        if transactions:
+            return JSONResponse(content=transactions, status_code=HTTP_200_OK)
+        raise Not_Found(f"No {name} found")
+
+    @router.get(f"/{name}/export")
+    async def export(
+        request: Request,
+        format: str = Query("csv", description="csv or ndjson"),
+    ):
+        """Downloads the logged in user's whole history, gzipped when the
+        client accepts it"""
+        if format not in EXPORT_MEDIA_TYPES:
+            raise Bad_Request(f"Unsupported format: {format}")
+        compress = "gzip" in request.headers.get("accept-encoding", "")
+        headers = {"Content-Disposition": f'attachment; filename="{name}.{format}"'}
+        if compress:
+            headers["Content-Encoding"] = "gzip"
+            headers["Vary"] = "Accept-Encoding"
+        return StreamingResponse(
+            export_transactions(model, request.state.user["user_id"], format, compress),
+            media_type=EXPORT_MEDIA_TYPES[format],
+            headers=headers,
+        )
+
+    @router.put(f"/{name}/{{transaction_id}}")
+    async def update(
+        request: Request,
+        transaction_id: str,
+        transaction_update: TransactionUpdate,
+        db: DBSession,
+    ):
+        """Edits one of the logged in user's transactions"""
+        try:
+            transaction = await update_transaction(
+                db,
+                model,
+                request.state.user["user_id"],
+                transaction_id,
+                transaction_update.model_dump(exclude_unset=True),
+            )
+        except ValueError as e:
+            raise Bad_Request(str(e))
+        if not transaction:
+            raise Not_Found("Transaction does not exist")
+        return JSONResponse(content=transaction, status_code=HTTP_200_OK)
+
+    @router.delete(f"/{name}/{{transaction_id}}")
+    async def delete(request: Request, transaction_id: str, db: DBSession):
+        """Soft deletes one of the logged in user's transactions"""
+        success = await delete_transaction(
+            db, model, request.state.user["user_id"], transaction_id
+        )
+        if success:
+            return JSONResponse(
+                content="Transaction deleted successfully", status_code=HTTP_200_OK
+            )
+        raise Not_Found("Transaction does not exist")
+
+    @router.post(f"/{name}/import")
+    async def bulk_import(
+        request: Request,
+        db: DBSession,
+        file: UploadFile = File(...),
+        format: str = Query(None, description="csv or ndjson, guessed if missing"),
+    ):
+        """Imports a CSV or NDJSON file of transactions in one transaction.
+        Columns/keys: amount, currency, category_id, description, timestamp"""
+        file_format = detect_format(file, format)
+        if file_format not in IMPORT_FORMATS:
+            raise Bad_Request(f"Unsupported format: {file_format}")
+        report = await import_transactions(
+            db, model, request.state.user["user_id"], file, file_format
+        )
+        return JSONResponse(content=report, status_code=HTTP_201_CREATED)
+
+    return router
+
+
+expense_router = create_transaction_router(Expense, "expenses")
+income_router = create_transaction_router(Income, "incomes")
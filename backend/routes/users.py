@@ -1,4 +1,4 @@
-from storage.db import get_db
+from storage.db import DBSession
 from storage.redis import redis_cache
 from dotenv import load_dotenv
 from crud.users import (
@@ -9,19 +9,17 @@ from crud.users import (
     update_user,
 )
 from fastapi import APIRouter, Request, BackgroundTasks, Depends, Query
-from fastapi.responses import JSONResponse
+from utils.codec import JSONResponse
 from fastapi.security import OAuth2PasswordRequestForm
 from schemas.userschema import UserExpected, UserResponse, UserUpdate
-from sqlalchemy.orm import Session
 from starlette.status import HTTP_201_CREATED, HTTP_200_OK
 from typing import Annotated
 from uuid import uuid4
 from utils.errors import Not_Found, ServerError, Unauthorized, Forbidden, Bad_Request
-from utils.utils import (
-    create_user_token_key,
-    model_to_dict,
-)
+from utils.utils import create_user_token_key
 from utils.email import send_welcome_email_to_user
+from utils.pagination import MAX_PAGE_LIMIT
+from utils.ratelimit import rate_limit
 from utils.security import authenticate_user, create_access_token
 
 
@@ -31,10 +29,15 @@ load_dotenv()
 user_router = APIRouter()
 
 
-@user_router.post("/register", response_model=UserResponse)
-async def register(background_tasks: BackgroundTasks, user_input: UserExpected):
+@user_router.post(
+    "/register", response_model=UserResponse, dependencies=[rate_limit("register")]
+)
+async def register(
+    background_tasks: BackgroundTasks, user_input: UserExpected, db: DBSession
+):
     """Route for Registration"""
     user = await create_user(
+        db,
         name=user_input.username,
         email=user_input.email,
         password=user_input.password,
@@ -48,9 +51,11 @@ async def register(background_tasks: BackgroundTasks, user_input: UserExpected):
     return JSONResponse(content=user, status_code=HTTP_201_CREATED)
 
 
-@user_router.post("/login")
-async def login(form_data: Annotated[OAuth2PasswordRequestForm, Depends()]):
-    user = authenticate_user(form_data.username, form_data.password)
+@user_router.post("/login", dependencies=[rate_limit("login")])
+async def login(
+    form_data: Annotated[OAuth2PasswordRequestForm, Depends()], db: DBSession
+):
+    user = await authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise Unauthorized(detail="Invalid Email or Password")
     data = {"user_id": user.id, "email": user.email}
@@ -67,41 +72,51 @@ async def login(form_data: Annotated[OAuth2PasswordRequestForm, Depends()]):
 
 
 @user_router.put("/edit_profile/{user_id}")
-async def edit_profile(
-    user_id: str, user_update: UserUpdate, db: Session = Depends(get_db)
-):
+async def edit_profile(user_id: str, user_update: UserUpdate, db: DBSession):
     """Allows a user to edit the profile of another user"""
-    user = update_user(user_id, user_update.dict(exclude_unset=True))
+    user = await update_user(db, user_id, user_update.dict(exclude_unset=True))
     if not user:
         raise Not_Found("User does not exist")
     return JSONResponse(content=user, status_code=HTTP_200_OK)
 
 
 @user_router.put("/edit_my_profile")
-async def edit_my_profile(request: Request, user_update: UserUpdate):
+async def edit_my_profile(request: Request, user_update: UserUpdate, db: DBSession):
     """Edits a user's profile by the user"""
     current_user = request.state.user
-    user = update_user(current_user["user_id"], user_update.dict(exclude_unset=True))
+    user = await update_user(
+        db, current_user["user_id"], user_update.dict(exclude_unset=True)
+    )
     if not user:
         raise Not_Found(f"User does not exist")
-    return JSONResponse(content=model_to_dict(user), status_code=HTTP_201_CREATED)
+    return JSONResponse(content=user, status_code=HTTP_201_CREATED)
 
 
 @user_router.get("/users")
-async def get_all_users(page: int = Query(1, ge=1), limit: int = Query(20, ge=1)):
+async def get_all_users(
+    db: DBSession,
+    cursor: str = Query(None, description="next_cursor of the previous page"),
+    limit: int = Query(20, ge=1, le=MAX_PAGE_LIMIT),
+    include_total: bool = False,
+):
     """Gets all the users in the DB"""
-    users = get_users(page=page, limit=limit)
+    try:
+        users = await get_users(
+            db, limit=limit, cursor=cursor, include_total=include_total
+        )
+    except ValueError as e:
+        raise Bad_Request(str(e))
     if users:
         return JSONResponse(content=users, status_code=HTTP_200_OK)
     raise Not_Found("users do not exist")
 
 
 @user_router.put("/delete_user/{user_id}")
-async def delete_user(request: Request, user_id: str):
+async def delete_user(request: Request, user_id: str, db: DBSession):
     """This deletes a user from the system"""
     if request.state.user["role"] != "superuser":
         raise Unauthorized("You are not authorized to perform this action")
-    success = delete_a_user(user_id, request.state.user["user_id"])
+    success = await delete_a_user(db, user_id, request.state.user["user_id"])
     if success:
         return JSONResponse(
             content="User successfully deleted", status_code=HTTP_200_OK
@@ -110,11 +125,11 @@ async def delete_user(request: Request, user_id: str):
 
 
 @user_router.delete("/rm_user_perm/{user_id}")
-async def remove_user(request: Request, user_id: str):
+async def remove_user(request: Request, user_id: str, db: DBSession):
     """This permanently deletes a user from the system"""
     if request.state.user["role"] != "superuser":
         raise Unauthorized("You are not authorized to perform this action")
-    success = delete_a_user_permanently(user_id)
+    success = await delete_a_user_permanently(db, user_id)
     if success == 0:
         raise Unauthorized("This user has to be deactivated first")
     if success == 1:
@@ -0,0 +1,13 @@
+from models.budget import BudgetPeriod
+from pydantic import BaseModel, Field
+from typing import Optional
+from utils.money import Currency, MoneyAmount
+
+
+class BudgetExpected(BaseModel):
+    """Model for creating a Budget"""
+
+    category_id: str = Field(description="Category the budget caps", max_length=50)
+    amount_limit: MoneyAmount = Field(description="Most to spend in a period")
+    currency: Optional[Currency] = None
+    period: BudgetPeriod = Field(description="weekly (from Monday) or monthly")
@@ -0,0 +1,45 @@
+from datetime import datetime
+from pydantic import AfterValidator, BaseModel, Field, field_validator
+from typing import Annotated, Optional
+from utils.money import Currency, MoneyAmount
+from utils.utils import naive_local
+
+# timestamps given with a UTC offset are stored in server local time, like
+# the naive ones and the analytics range bounds
+LocalDateTime = Annotated[datetime, AfterValidator(naive_local)]
+
+
+class TransactionExpected(BaseModel):
+    """Model for creating an Expense or an Income"""
+
+    amount: MoneyAmount = Field(description="Amount of the transaction")
+    currency: Optional[Currency] = Field(
+        default=None, description="Currency of the amount. Defaults to the app's"
+    )
+    category_id: Optional[str] = Field(
+        default=None,
+        description="Category of the transaction. Required for expenses",
+        max_length=50,
+    )
+    description: Optional[str] = Field(default=None, max_length=200)
+    timestamp: Optional[LocalDateTime] = Field(
+        default=None, description="When the transaction happened. Defaults to now"
+    )
+
+
+class TransactionUpdate(BaseModel):
+    """Model for updating an Expense or an Income"""
+
+    amount: Optional[MoneyAmount] = None
+    currency: Optional[Currency] = None
+    category_id: Optional[str] = Field(default=None, max_length=50)
+    description: Optional[str] = Field(default=None, max_length=200)
+    timestamp: Optional[LocalDateTime] = None
+
+    @field_validator("amount", "currency", "timestamp", mode="before")
+    @classmethod
+    def not_null(cls, value, info):
+        """Fields left out are kept, but these columns cannot be cleared"""
+        if value is None:
+            raise ValueError(f"{info.field_name} cannot be null")
+        return value
@@ -0,0 +1,71 @@
+#!/usr/bin/python3
+"""Reports the Redis memory used by each cache key family
+
+Keys are grouped by the part before the first ":" (User, Categories,
+UserSessionToken, ...) and MEMORY USAGE is sampled for up to --sample keys
+of each family, so the totals of large families are estimates. The
+"no ttl" column counts the sampled keys that never expire.
+
+Run from the backend directory:
+    python -m storage.cache_report [--sample N] [--match PATTERN]
+"""
+
+import argparse
+import asyncio
+import random
+from collections import defaultdict
+from storage.redis import key_family, redis_cache, ttl_for
+
+SCAN_COUNT = 1000
+
+
+async def collect(match: str) -> dict:
+    """Returns the keys matching the pattern grouped by family"""
+    families = defaultdict(list)
+    async for key in redis_cache.r.scan_iter(match=match, count=SCAN_COUNT):
+        families[key_family(key)].append(key)
+    return families
+
+
+async def measure(keys: list, sample: int) -> tuple:
+    """Returns the MEMORY USAGE and TTL of a random sample of keys"""
+    keys = random.sample(keys, min(sample, len(keys)))
+    async with redis_cache.r.pipeline(transaction=False) as pipe:
+        for key in keys:
+            pipe.memory_usage(key, samples=0)
+            pipe.ttl(key)
+        replies = await pipe.execute()
+    # keys expiring between SCAN and the pipeline come back as None/-2
+    sizes = [size for size in replies[::2] if size]
+    persistent = sum(1 for ttl in replies[1::2] if ttl == -1)
+    return sizes, persistent, len(keys)
+
+
+async def report(sample: int, match: str):
+    families = await collect(match)
+    rows = []
+    for family, keys in families.items():
+        sizes, persistent, sampled = await measure(keys, sample)
+        average = sum(sizes) / len(sizes) if sizes else 0
+        rows.append((family, len(keys), average, average * len(keys), persistent))
+    rows.sort(key=lambda row: row[3], reverse=True)
+    print(
+        f"{'family':<20} {'keys':>10} {'avg bytes':>10} {'est. bytes':>14}"
+        f" {'policy ttl':>10} {'no ttl':>8}"
+    )
+    for family, count, average, total, persistent in rows:
+        print(
+            f"{family:<20} {count:>10,} {average:>10,.0f} {total:>14,.0f}"
+            f" {ttl_for(family + ':'):>10,} {persistent:>8,}"
+        )
+    total = sum(row[3] for row in rows)
+    print(f"{'total':<20} {sum(row[1] for row in rows):>10,} {'':>10} {total:>14,.0f}")
+    await redis_cache.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sample", type=int, default=200, help="keys per family")
+    parser.add_argument("--match", default="*", help="SCAN pattern")
+    args = parser.parse_args()
+    asyncio.run(report(args.sample, args.match))
@@ -0,0 +1,275 @@
+#!/usr/bin/python3
+"""Module for schema upgrades and moving deleted rows to the archive tables
+
+Run from the backend directory:
+    python -m storage.migrations upgrade
+    python -m storage.migrations migrate-ids
+    python -m storage.migrations migrate-money
+    python -m storage.migrations archive [--older-than-days N] [--batch-size N]
+    python -m storage.migrations rebuild-budgets
+"""
+import argparse
+import asyncio
+from crud.budgets import rebuild_budget_spend
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from models import budget, category, expense, income, user
+from models.archive import ARCHIVES
+from models.basemodel import Base
+from os import environ
+from sqlalchemy import BINARY, BigInteger, delete, inspect, select
+from sqlalchemy.schema import AddConstraint
+from storage.db import SessionLocal, async_engine, engine, session_scope
+from time import perf_counter
+from utils.ids import BinaryId, new_id
+from utils.money import DEFAULT_CURRENCY, MINOR_UNITS, Money
+
+load_dotenv()
+
+ARCHIVE_BATCH_SIZE = int(environ.get("PFT_ARCHIVE_BATCH_SIZE", 5000))
+# a uuid text key once its dashes are removed
+UUID_HEX = "^[0-9a-fA-F]{32}$"
+
+
+def upgrade():
+    """Creates missing tables, then indexes missing from existing tables and
+    rebuilds those whose columns changed. create_all alone skips the indexes
+    of tables that already exist. Importing every model module above puts
+    all the tables on Base.metadata"""
+    Base.metadata.create_all(bind=engine)
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        existing = {
+            index["name"]: index["column_names"]
+            for index in inspector.get_indexes(table.name)
+        }
+        for index in table.indexes:
+            columns = [column.name for column in index.columns]
+            if index.name not in existing:
+                print(f"Creating index {index.name} on {table.name}")
+                index.create(bind=engine)
+            elif existing[index.name] != columns:
+                print(f"Rebuilding index {index.name} on {table.name}")
+                index.drop(bind=engine)
+                index.create(bind=engine)
+
+
+def migrate_ids():
+    """Converts the uuid text keys of existing MySQL tables to BINARY(16).
+    Foreign keys are dropped first and recreated from the models; rows
+    whose id is not a uuid get a new one first. Run it once with the app
+    stopped, MySQL commits each ALTER on its own"""
+    if engine.dialect.name != "mysql":
+        print("migrate-ids only converts MySQL tables")
+        return
+    inspector = inspect(engine)
+    tables = [
+        table
+        for table in Base.metadata.sorted_tables
+        if inspector.has_table(table.name)
+    ]
+    with engine.begin() as conn:
+        for table in tables:
+            for foreign_key in inspector.get_foreign_keys(table.name):
+                conn.exec_driver_sql(
+                    f"ALTER TABLE `{table.name}` "
+                    f"DROP FOREIGN KEY `{foreign_key['name']}`"
+                )
+        existing = {
+            table.name: {
+                column["name"]: column["type"]
+                for column in inspector.get_columns(table.name)
+            }
+            for table in tables
+        }
+        for table in tables:
+            id_type = existing[table.name].get("id")
+            if id_type is not None and not isinstance(id_type, BINARY):
+                replace_invalid_ids(conn, table, tables)
+        for table in tables:
+            for column in table.columns:
+                name = column.name
+                if not isinstance(column.type, BinaryId):
+                    continue
+                if name not in existing[table.name]:
+                    continue
+                if isinstance(existing[table.name][name], BINARY):
+                    continue
+                invalid = conn.exec_driver_sql(
+                    f"SELECT COUNT(*) FROM `{table.name}` WHERE `{name}` IS NOT NULL "
+                    f"AND REPLACE(`{name}`, '-', '') NOT REGEXP %s",
+                    (UUID_HEX,),
+                ).scalar()
+                if invalid:
+                    raise SystemExit(
+                        f"{table.name}.{name} has {invalid} values that are not "
+                        "uuids and match no row, fix or remove them first"
+                    )
+                print(f"Converting {table.name}.{name}")
+                null = "NULL" if column.nullable else "NOT NULL"
+                # as bytes first, so UNHEX output is not read as text
+                for statement in (
+                    f"ALTER TABLE `{table.name}` MODIFY `{name}` VARBINARY(50) {null}",
+                    f"UPDATE `{table.name}` SET `{name}` = "
+                    f"UNHEX(REPLACE(`{name}`, '-', '')) WHERE `{name}` IS NOT NULL",
+                    f"ALTER TABLE `{table.name}` MODIFY `{name}` BINARY(16) {null}",
+                ):
+                    conn.exec_driver_sql(statement)
+        for table in tables:
+            for constraint in table.foreign_key_constraints:
+                conn.execute(AddConstraint(constraint))
+
+
+def replace_invalid_ids(conn, table, tables: list):
+    """Gives rows whose id is not a uuid, such as the text of the uuid4
+    function an old default stored, a new UUIDv7, and points the columns
+    referencing them at it. UNHEX would turn those ids into NULL"""
+    references = [
+        (other.name, foreign_key.parent.name)
+        for other in tables
+        for foreign_key in other.foreign_keys
+        if foreign_key.column.table is table
+    ]
+    # archived rows keep the references of their hot table, without the keys
+    for model, archive_table in ARCHIVES.items():
+        if archive_table in tables:
+            references += [
+                (archive_table.name, foreign_key.parent.name)
+                for foreign_key in model.__table__.foreign_keys
+                if foreign_key.column.table is table
+            ]
+    invalid_ids = conn.exec_driver_sql(
+        f"SELECT `id` FROM `{table.name}` "
+        f"WHERE REPLACE(`id`, '-', '') NOT REGEXP %s",
+        (UUID_HEX,),
+    ).scalars()
+    for invalid_id in invalid_ids.all():
+        replacement = new_id()
+        print(f"Replacing id {invalid_id!r} of {table.name} with {replacement}")
+        conn.exec_driver_sql(
+            f"UPDATE `{table.name}` SET `id` = %s WHERE `id` = %s",
+            (replacement, invalid_id),
+        )
+        for name, column in references:
+            conn.exec_driver_sql(
+                f"UPDATE `{name}` SET `{column}` = %s WHERE `{column}` = %s",
+                (replacement, invalid_id),
+            )
+
+
+def migrate_money():
+    """Converts the Float amounts of existing MySQL tables to BIGINT minor
+    units and adds the currency columns, set to PFT_DEFAULT_CURRENCY, and
+    to the primary key of the budget spend rollup. Run it once with the app
+    stopped; the command then rebuilds the rollup"""
+    if engine.dialect.name != "mysql":
+        print("migrate-money only converts MySQL tables")
+        return
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {
+                column["name"]: column["type"]
+                for column in inspector.get_columns(table.name)
+            }
+            if "currency" in table.columns and "currency" not in existing:
+                print(f"Adding {table.name}.currency")
+                conn.exec_driver_sql(
+                    f"ALTER TABLE `{table.name}` ADD COLUMN `currency` VARCHAR(3) "
+                    f"NOT NULL DEFAULT '{DEFAULT_CURRENCY}'"
+                )
+            for column in table.columns:
+                name = column.name
+                if not isinstance(column.type, Money) or name not in existing:
+                    continue
+                if isinstance(existing[name], BigInteger):
+                    continue
+                print(f"Converting {table.name}.{name}")
+                null = "NULL" if column.nullable else "NOT NULL"
+                # FLOAT keeps ~7 digits, rounding to the cent recovers the
+                # amounts that were entered
+                for statement in (
+                    f"ALTER TABLE `{table.name}` MODIFY `{name}` DOUBLE {null}",
+                    f"UPDATE `{table.name}` SET `{name}` = "
+                    f"ROUND(`{name}` * {MINOR_UNITS})",
+                    f"ALTER TABLE `{table.name}` MODIFY `{name}` BIGINT {null}",
+                ):
+                    conn.exec_driver_sql(statement)
+            primary_key = [column.name for column in table.primary_key]
+            existing_key = inspector.get_pk_constraint(table.name)
+            if existing_key["constrained_columns"] != primary_key:
+                print(f"Rebuilding the primary key of {table.name}")
+                columns = ", ".join(f"`{name}`" for name in primary_key)
+                conn.exec_driver_sql(
+                    f"ALTER TABLE `{table.name}` DROP PRIMARY KEY, "
+                    f"ADD PRIMARY KEY ({columns})"
+                )
+
+
+def archive(older_than_days: int = None, batch_size: int = ARCHIVE_BATCH_SIZE):
+    """Moves soft-deleted rows, only those older than `older_than_days` when
+    given, to the archive tables. Live rows always stay: the budget rollup
+    rebuild and the analytics only read the hot tables. Each batch is its
+    own short transaction so the hot tables are never locked for long"""
+    cutoff = None
+    if older_than_days is not None:
+        cutoff = datetime.now() - timedelta(days=older_than_days)
+    for model, archive_table in ARCHIVES.items():
+        conditions = [model.is_deleted == True]
+        if cutoff:
+            conditions.append(model.timestamp < cutoff)
+        columns = [column.name for column in model.__table__.columns]
+        moved = 0
+        start = perf_counter()
+        while True:
+            with SessionLocal() as db:
+                ids = db.scalars(select(model.id).where(*conditions).limit(batch_size))
+                ids = ids.all()
+                if not ids:
+                    break
+                rows = select(*model.__table__.columns).where(model.id.in_(ids))
+                db.execute(archive_table.insert().from_select(columns, rows))
+                db.execute(delete(model).where(model.id.in_(ids)))
+                db.commit()
+            moved += len(ids)
+        seconds = perf_counter() - start
+        print(f"Archived {moved} rows of {model.__tablename__} in {seconds:.1f}s")
+
+
+async def rebuild_budgets():
+    """Recomputes the budget spend rollup from the expenses.
+    Expense writes made while it runs may be lost, so pause them first"""
+    start = perf_counter()
+    async with session_scope() as db:
+        rows = await rebuild_budget_spend(db)
+    await async_engine.dispose()
+    print(f"Rebuilt {rows} budget spend rows in {perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("upgrade", help="create missing tables and indexes")
+    commands.add_parser("migrate-ids", help="convert uuid text keys to binary")
+    commands.add_parser("migrate-money", help="convert amounts to minor units")
+    archive_parser = commands.add_parser("archive", help="move deleted rows away")
+    archive_parser.add_argument(
+        "--older-than-days", type=int, help="only deleted rows older than this"
+    )
+    archive_parser.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE)
+    commands.add_parser("rebuild-budgets", help="recompute budget spend totals")
+    args = parser.parse_args()
+    if args.command == "upgrade":
+        upgrade()
+    elif args.command == "migrate-ids":
+        migrate_ids()
+    elif args.command == "migrate-money":
+        migrate_money()
+        # the rollup and its cached hashes still hold Float totals
+        asyncio.run(rebuild_budgets())
+    elif args.command == "archive":
+        archive(args.older_than_days, args.batch_size)
+    else:
+        asyncio.run(rebuild_budgets())
@@ -1,56 +1,198 @@
-import redis
-import json
+import asyncio
 import redis.exceptions
+from redis import asyncio as aioredis
+from dotenv import load_dotenv
+from os import environ
+from storage.localcache import LocalCache
+from utils import codec
+from uuid import uuid4
+
+load_dotenv()
+
+INVALIDATION_CHANNEL = "cache:invalidate"
+# field keeping hashes of empty record sets cached
+HASH_SENTINEL = "_"
+# sets a field only in cached hashes, a partial hash would hide the others
+HSET_IF_EXISTS_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+end
+"""
+# Refills a key from a DB snapshot only if no write bumped the key's generation
+# since the snapshot was read: a write committed while a refill runs is not
+# in its snapshot, and would be hidden until the key expires.
+# KEYS: generation key, key to fill. ARGV: generation read before loading,
+# TTL, then SET, HSET or SADD and the arguments to it
+FILL_IF_GENERATION_SCRIPT = """
+if (redis.call('GET', KEYS[1]) or '') ~= ARGV[1] then
+    return 0
+end
+redis.call('DEL', KEYS[2])
+redis.call(ARGV[3], KEYS[2], unpack(ARGV, 4))
+redis.call('EXPIRE', KEYS[2], ARGV[2])
+return 1
+"""
+
+# TTL in seconds of each key family, the part of a key before the first ":".
+CATEGORY_TTL = int(environ.get("PFT_TTL_CATEGORY", 7 * 86400))
+TTL_POLICIES = {
+    "User": int(environ.get("PFT_TTL_USER", 86400)),
+    "Categories": CATEGORY_TTL,
+    "CategoryNames": CATEGORY_TTL,
+    "UserSessionToken": int(environ.get("PFT_TTL_USER_SESSION_TOKEN", 3600)),
+}
+DEFAULT_TTL = int(environ.get("PFT_TTL_DEFAULT", 3600))
+
+
+def key_family(key: str) -> str:
+    """Returns the family of a cache key, e.g. User for User:<id>"""
+    return key.split(":", 1)[0]
+
+
+def ttl_for(key: str) -> int:
+    """Returns the TTL policy of a cache key"""
+    return TTL_POLICIES.get(key_family(key), DEFAULT_TTL)
 
 
 class RedisCache:
     """Redis setup for caching"""
 
-    def __init__(self, host: str, port: int):
-        self.r = redis.Redis(host=host, port=port, decode_responses=True)
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        max_connections: int = 50,
+        local_cache: LocalCache = None,
+    ):
+        self.pool = aioredis.ConnectionPool(
+            host=host,
+            port=port,
+            decode_responses=True,
+            max_connections=max_connections,
+        )
+        self.r = aioredis.Redis(connection_pool=self.pool)
+        # cache values are packed bytes, read them without decoding
+        self.raw_pool = aioredis.ConnectionPool(
+            host=host,
+            port=port,
+            max_connections=max_connections,
+        )
+        self.raw = aioredis.Redis(connection_pool=self.raw_pool)
+        self._hset_if_exists = self.raw.register_script(HSET_IF_EXISTS_SCRIPT)
+        self._fill_if_generation = self.raw.register_script(FILL_IF_GENERATION_SCRIPT)
+        self.local = local_cache
+        self.instance_id = uuid4().hex
+        self._listener = None
 
     async def set(
-        self, key: str, value, exp_seconds: int = 31622400, indexes: list[str] = []
+        self, key: str, value, exp_seconds: int = None, indexes: list[str] = []
     ):
-        """This method sets a key with the values in the cache"""
+        """This method sets a key with the values in the cache.
+        Without exp_seconds the TTL policy of the key family applies"""
+        if exp_seconds is None:
+            exp_seconds = ttl_for(key)
         try:
-            json_value = json.dumps(value)
-            self.r.set(key, json_value, ex=exp_seconds)
-            if indexes:
+            async with self.raw.pipeline(transaction=False) as pipe:
+                pipe.set(key, codec.pack(value), ex=exp_seconds)
                 for index in indexes:
-                    self.r.sadd(index, key)  # Add the key to the index
+                    pipe.sadd(index, key)  # Add the key to the index
+                    pipe.expire(index, max(ttl_for(index), exp_seconds))
+                self._publish(pipe, key, *indexes)
+                await pipe.execute()
+            if self.local:
+                self.local.delete(*indexes)
+                self.local.set(key, value, ttl=exp_seconds)
         except redis.exceptions.ConnectionError as e:
             print(f"Redis Connection Error: {e}")
 
     async def get(self, key: str):
         """Gets a cached value from the Redis cache"""
+        if self.local:
+            value = self.local.get(key)
+            if value is not None:
+                return value
         try:
-            json_value = self.r.get(key)
-            if json_value:
-                return json.loads(json_value)
+            packed = await self.raw.get(key)
+            if packed:
+                value = codec.unpack(packed)
+                if self.local:
+                    self.local.set(key, value)
+                return value
         except redis.exceptions.ConnectionError as e:
             print(f"Redis Connection Error: {e}")
             return None
 
+    async def get_with_ttl(self, key: str) -> tuple:
+        """Gets a cached value and its remaining TTL in seconds. The TTL is
+        None for values served by the short-lived local cache"""
+        if self.local:
+            value = self.local.get(key)
+            if value is not None:
+                return value, None
+        try:
+            async with self.raw.pipeline(transaction=False) as pipe:
+                pipe.get(key)
+                pipe.ttl(key)
+                packed, ttl = await pipe.execute()
+        except redis.exceptions.ConnectionError as e:
+            print(f"Redis Connection Error: {e}")
+            return None, None
+        if not packed:
+            return None, None
+        value = codec.unpack(packed)
+        if self.local:
+            self.local.set(key, value, ttl=ttl if ttl > 0 else None)
+        return value, ttl
+
     async def delete(self, key: str, index: str = None):
         """Deletes a cached value"""
+        if self.local:
+            self.local.delete(key, index)
         try:
-            self.r.delete(key)
-            if index:
-                self.r.srem(index, key)  # Remove the key from the index
+            async with self.r.pipeline(transaction=False) as pipe:
+                pipe.delete(key)
+                if index:
+                    pipe.srem(index, key)  # Remove the key from the index
+                self._publish(pipe, key, index)
+                await pipe.execute()
         except redis.exceptions.ConnectionError as e:
             print(f"Redis Connection Error: {e}")
 
     async def get_index(self, indexes: list[str]) -> list:
-        """Gets all the items saved in an index"""
+        """Gets all the items saved in an index.
+        Uses one round trip for the index members and one MGET for the values.
+        An index whose members have expired is incomplete, it is dropped and
+        its items are left for the caller to load"""
         output = []
+        missing = []
+        for index in indexes:
+            cached = self.local.get(index) if self.local else None
+            if cached is not None:
+                output.extend(cached)
+            else:
+                missing.append(index)
+        if not missing:
+            return output
         try:
-            for index in indexes:
-                keys = self.r.smembers(index)
-                if keys:
-                    for key in keys:
-                        value = await self.get(key)
-                        output.append(value)
+            async with self.r.pipeline(transaction=False) as pipe:
+                for index in missing:
+                    pipe.smembers(index)
+                members = await pipe.execute()
+            keys = [key for group in members for key in group]
+            values = await self.raw.mget(keys) if keys else []
+            # keys that expired since they were indexed come back as None
+            values = dict(zip(keys, values))
+            stale = []
+            for index, group in zip(missing, members):
+                if not all(values[key] for key in group):
+                    stale.append(index)
+                    continue
+                items = [codec.unpack(values[key]) for key in group]
+                if self.local and items:
+                    self.local.set(index, items)
+                output.extend(items)
+            if stale:
+                await self.r.delete(*stale)
             return output
         except redis.exceptions.ConnectionError as e:
             print(f"Redis Connection Error: {e}")
@@ -59,13 +201,222 @@ class RedisCache:
     async def delete_indexgroup(self, index: str):
         """deletes all the values belonging to keys in an index"""
         try:
-            keys = self.r.smembers(index)
+            keys = await self.r.smembers(index)
+            if self.local:
+                self.local.delete(index, *keys)
             if keys:
+                async with self.r.pipeline(transaction=False) as pipe:
+                    pipe.delete(*keys, index)
+                    self._publish(pipe, index, *keys)
+                    await pipe.execute()
+        except redis.exceptions.ConnectionError as e:
+            print(f"Redis Connection Error: {e}")
+
+    async def get_hash(self, key: str) -> dict:
+        """Gets all the fields of a Redis hash, None if it is not cached"""
+        try:
+            return await self.r.hgetall(key) or None
+        except redis.exceptions.ConnectionError as e:
+            print(f"Redis Connection Error: {e}")
+            return None
+
+    async def set_hash(
+        self, key: str, mapping: dict, exp_seconds: int, generation: str
+    ):
+        """Replaces a Redis hash with the given fields, unless the key was
+        written to since its generation was read"""
+        args = [item for field_value in mapping.items() for item in field_value]
+        await self._fill(key, generation, exp_seconds, "HSET", args)
+
+    @staticmethod
+    def generation_key(key: str) -> str:
+        """Creates the key counting the writes to a cached key"""
+        return f"Gen:{key}"
+
+    async def generations(self, keys: list[str]) -> list:
+        """Reads the generation of keys about to be loaded from the DB, to
+        pass to the fill. None if Redis cannot be reached"""
+        try:
+            values = await self.r.mget([self.generation_key(key) for key in keys])
+        except redis.exceptions.ConnectionError as e:
+            print(f"Redis Connection Error: {e}")
+            return None
+        return [value or "" for value in values]
+
+    async def bump_generations(self, keys: list[str]) -> list:
+        """Marks keys as written to after a commit, so that refills which
+        read the DB before it do not cache their snapshot. Generations live
+        for the default TTL, far longer than any refill takes. Returns the
+        new generations, None if Redis cannot be reached"""
+        try:
+            async with self.r.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    generation_key = self.generation_key(key)
+                    pipe.incr(generation_key)
+                    pipe.expire(generation_key, ttl_for(generation_key))
+                results = await pipe.execute()
+        except redis.exceptions.ConnectionError as e:
+            print(f"Redis Connection Error: {e}")
+            return None
+        return results[::2]
+
+    async def _fill(
+        self, key: str, generation: str, exp_seconds: int, command: str, args: list
+    ):
+        """Replaces a value (SET), a hash (HSET) or a set (SADD) if its
+        generation is still the one read before loading it. Returns whether
+        it was replaced"""
+        if generation is None:
+            return False
+        try:
+            filled = await self._fill_if_generation(
+                keys=[self.generation_key(key), key],
+                args=[generation, exp_seconds, command, *args],
+                client=self.raw,
+            )
+        except redis.exceptions.ConnectionError as e:
+            print(f"Redis Connection Error: {e}")
+            return False
+        return filled == 1
+
+    async def fill(self, key: str, value, exp_seconds: int, generation: str):
+        """Caches a value loaded from the DB, unless the key was written to
+        since its generation was read"""
+        if await self._fill(key, generation, exp_seconds, "SET", [codec.pack(value)]):
+            if self.local:
+                self.local.set(key, value, ttl=exp_seconds)
+
+    async def get_records(self, keys: list[str]) -> list:
+        """Gets hashes of packed records {field: value} in one round trip,
+        with None for the hashes that are not cached"""
+        try:
+            async with self.raw.pipeline(transaction=False) as pipe:
                 for key in keys:
-                    self.r.delete(key)
-                self.r.delete(index)
+                    pipe.hgetall(key)
+                hashes = await pipe.execute()
+        except redis.exceptions.ConnectionError as e:
+            print(f"Redis Connection Error: {e}")
+            return [None] * len(keys)
+        return [
+            (
+                {
+                    field.decode(): codec.unpack(value)
+                    for field, value in fields.items()
+                    if field != HASH_SENTINEL.encode()
+                }
+                if fields
+                else None
+            )
+            for fields in hashes
+        ]
+
+    async def set_records(self, hashes: dict[str, dict], generations: list):
+        """Replaces hashes of records {key: {field: value}} with the TTL
+        policy of each key, skipping those written to since their generation
+        was read. generations follow the order of hashes"""
+        if generations is None:
+            return
+        try:
+            async with self.raw.pipeline(transaction=False) as pipe:
+                for (key, records), generation in zip(hashes.items(), generations):
+                    args = [HASH_SENTINEL, b""]
+                    for field, value in records.items():
+                        args += [field, codec.pack(value)]
+                    await self._fill_if_generation(
+                        keys=[self.generation_key(key), key],
+                        args=[generation, ttl_for(key), "HSET", *args],
+                        client=pipe,
+                    )
+                await pipe.execute()
+        except redis.exceptions.ConnectionError as e:
+            print(f"Redis Connection Error: {e}")
+
+    async def set_members(self, sets: dict[str, set], generations: list):
+        """Replaces sets {key: members} with the TTL policy of each key,
+        skipping those written to since their generation was read"""
+        if generations is None:
+            return
+        try:
+            async with self.r.pipeline(transaction=False) as pipe:
+                for (key, members), generation in zip(sets.items(), generations):
+                    await self._fill_if_generation(
+                        keys=[self.generation_key(key), key],
+                        args=[generation, ttl_for(key), "SADD", *members],
+                        client=pipe,
+                    )
+                await pipe.execute()
+        except redis.exceptions.ConnectionError as e:
+            print(f"Redis Connection Error: {e}")
+
+    async def set_record(self, key: str, field: str, value):
+        """Adds or replaces one record of a cached hash"""
+        try:
+            await self._hset_if_exists(
+                keys=[key], args=[field, codec.pack(value)], client=self.raw
+            )
+        except redis.exceptions.ConnectionError as e:
+            print(f"Redis Connection Error: {e}")
+
+    async def delete_record(self, key: str, field: str):
+        """Removes one record of a hash"""
+        try:
+            await self.raw.hdel(key, field)
         except redis.exceptions.ConnectionError as e:
             print(f"Redis Connection Error: {e}")
 
+    def _publish(self, pipe, *keys: str):
+        """Queues an invalidation message for the other workers' local caches"""
+        if not self.local:
+            return
+        message = {"origin": self.instance_id, "keys": [key for key in keys if key]}
+        pipe.publish(INVALIDATION_CHANNEL, codec.dumps(message))
+
+    async def listen_for_invalidations(self):
+        """Drops local entries invalidated by writes on other workers"""
+        while True:
+            pubsub = self.r.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                async for message in pubsub.listen():
+                    data = codec.loads(message["data"])
+                    if data["origin"] != self.instance_id:
+                        self.local.delete(*data["keys"])
+            except redis.exceptions.ConnectionError as e:
+                print(f"Redis Connection Error: {e}")
+                # invalidations may have been missed while disconnected
+                self.local.clear()
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+
+    def start_invalidation_listener(self):
+        """Starts the pub/sub listener when a local cache is configured"""
+        if self.local and self._listener is None:
+            self._listener = asyncio.create_task(self.listen_for_invalidations())
+
+    def stats(self) -> dict:
+        """Returns the local cache counters"""
+        if not self.local:
+            return {"local_cache": None}
+        return {"local_cache": self.local.stats()}
+
+    async def close(self):
+        """Stops the listener and closes the connection pool"""
+        if self._listener:
+            self._listener.cancel()
+            self._listener = None
+        await self.r.aclose()
+        await self.raw.aclose()
+        await self.pool.aclose()
+        await self.raw_pool.aclose()
+
+
+L1_CACHE_SIZE = int(environ.get("PFT_L1_CACHE_SIZE", 2048))
+L1_CACHE_TTL = int(environ.get("PFT_L1_CACHE_TTL", 30))
 
-redis_cache = RedisCache(host="localhost", port=6379)
+redis_cache = RedisCache(
+    host=environ.get("REDIS_HOST", "localhost"),
+    port=int(environ.get("REDIS_PORT", 6379)),
+    max_connections=int(environ.get("REDIS_MAX_CONNECTIONS", 50)),
+    local_cache=LocalCache(L1_CACHE_SIZE, L1_CACHE_TTL) if L1_CACHE_SIZE else None,
+)
@@ -0,0 +1,153 @@
+#!/usr/bin/python3
+"""Module for cache stampede protection: one load per key on a miss"""
+import asyncio
+import redis.exceptions
+from dotenv import load_dotenv
+from functools import wraps
+from os import environ
+from storage.redis import redis_cache, ttl_for
+from time import monotonic
+from uuid import uuid4
+
+load_dotenv()
+
+# how long a worker may hold a key before others give up waiting on it
+LOCK_TTL_MS = int(environ.get("PFT_SINGLEFLIGHT_LOCK_MS", 5000))
+POLL_INTERVAL = 0.05
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+release_lock_script = redis_cache.r.register_script(RELEASE_LOCK_SCRIPT)
+
+# loads in progress in this worker, by cache key
+flights: dict[str, asyncio.Future] = {}
+# background stale-while-revalidate refreshes, kept until they finish
+refreshes = set()
+
+
+def create_lock_key(key: str):
+    """Creates the key of the lock held by the worker loading a cache key"""
+    return f"lock:{key}"
+
+
+async def fly(key: str, load, lookup=None):
+    """Loads a key under a short Redis lock. Workers finding it taken poll
+    lookup() for the holder's result, and load it themselves if the lock
+    expires first. Without lookup, e.g. for background refreshes, they
+    leave the load to the holder and return None"""
+    lock_key, token = create_lock_key(key), uuid4().hex
+    try:
+        locked = await redis_cache.r.set(lock_key, token, nx=True, px=LOCK_TTL_MS)
+    except redis.exceptions.ConnectionError as e:
+        print(f"Redis Connection Error: {e}")
+        return await load()
+    if not locked and lookup is None:
+        return None
+    if not locked:
+        deadline = monotonic() + LOCK_TTL_MS / 1000
+        while monotonic() < deadline:
+            await asyncio.sleep(POLL_INTERVAL)
+            value = await lookup()
+            if value is not None:
+                return value
+    try:
+        return await load()
+    finally:
+        if locked:
+            try:
+                await release_lock_script(
+                    keys=[lock_key], args=[token], client=redis_cache.r
+                )
+            except redis.exceptions.ConnectionError as e:
+                print(f"Redis Connection Error: {e}")
+
+
+async def single_flight(key: str, load, lookup=None):
+    """Runs load() once for all the concurrent misses on a key: callers in
+    this worker await the same future, other workers wait on a Redis lock"""
+    flight = flights.get(key)
+    if flight is None:
+        flight = flights[key] = asyncio.ensure_future(fly(key, load, lookup))
+        flight.add_done_callback(
+            lambda done: flights.pop(key) if flights.get(key) is done else None
+        )
+    # one caller giving up must not cancel the load for the others
+    return await asyncio.shield(flight)
+
+
+def revalidate(key: str, load):
+    """Refreshes a key in the background, unless a load is already running"""
+    if key in flights:
+        return
+
+    async def refresh():
+        try:
+            await single_flight(key, load)
+        except Exception as e:
+            print(f"Cache refresh of {key} failed: {e}")
+
+    task = asyncio.create_task(refresh())
+    refreshes.add(task)
+    task.add_done_callback(refreshes.discard)
+
+
+def cached(key, ttl: int = None, stale_ttl: int = 0):
+    """Caches the result of an async loader under key(*args), loading it
+    once for concurrent misses. With stale_ttl, a value is kept that much
+    longer and served while one background call refreshes it. Loaders
+    open their own session, as refreshes outlive the request. None results
+    are not cached. The wrapper has .invalidate(*args) and .prime(value, *args)
+    """
+
+    def decorator(loader):
+        def expiry(cache_key: str) -> int:
+            return (ttl or ttl_for(cache_key)) + stale_ttl
+
+        @wraps(loader)
+        async def wrapper(*args):
+            cache_key = key(*args)
+
+            async def load():
+                # read before the DB, a write committed after it skips the fill
+                generations = await redis_cache.generations([cache_key])
+                value = await loader(*args)
+                if value is not None:
+                    await redis_cache.fill(
+                        cache_key,
+                        value,
+                        expiry(cache_key),
+                        generations and generations[0],
+                    )
+                return value
+
+            value, remaining = await redis_cache.get_with_ttl(cache_key)
+            if value is None:
+                return await single_flight(
+                    cache_key, load, lambda: redis_cache.get(cache_key)
+                )
+            if stale_ttl and remaining is not None and 0 <= remaining <= stale_ttl:
+                revalidate(cache_key, load)
+            return value
+
+        async def invalidate(*args):
+            """Drops the cached value of these arguments, and keeps loads that
+            read the DB before the change from caching it again"""
+            cache_key = key(*args)
+            await redis_cache.bump_generations([cache_key])
+            await redis_cache.delete(cache_key)
+
+        async def prime(value, *args):
+            """Caches a value known to be fresh, e.g. after a write, over any
+            load that read the DB before it"""
+            cache_key = key(*args)
+            await redis_cache.bump_generations([cache_key])
+            await redis_cache.set(cache_key, value, expiry(cache_key))
+
+        wrapper.invalidate = invalidate
+        wrapper.prime = prime
+        return wrapper
+
+    return decorator
@@ -0,0 +1,103 @@
+#!/usr/bin/python3
+"""Module for JSON encoding, with orjson when it is installed, and for the
+compact binary encoding of cache values"""
+import json
+import zlib
+from datetime import date, datetime
+from decimal import Decimal
+from dotenv import load_dotenv
+from fastapi.responses import JSONResponse as StarletteJSONResponse
+from os import environ
+from uuid import UUID
+
+try:
+    import orjson
+except ImportError:  # pip install ".[speedups]" for the fast path
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+load_dotenv()
+
+
+def _default(value):
+    """Encodes the types orjson handles natively, for the stdlib fallback"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (UUID, Decimal)):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+if orjson:
+    CODEC = "orjson"
+    _OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def dumps(value) -> bytes:
+        """Encodes a value to compact JSON bytes"""
+        return orjson.dumps(value, default=_default, option=_OPTIONS)
+
+    loads = orjson.loads
+else:
+    CODEC = "json"
+    _encoder = json.JSONEncoder(
+        default=_default, ensure_ascii=False, separators=(",", ":")
+    )
+
+    def dumps(value) -> bytes:
+        """Encodes a value to compact JSON bytes"""
+        return _encoder.encode(value).encode("utf-8")
+
+    loads = json.loads
+
+
+class JSONResponse(StarletteJSONResponse):
+    """JSONResponse rendered with the fastest codec available"""
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+# Cache values start with a marker byte telling how they were encoded.
+# Values without one are JSON, as written before markers existed; JSON
+# never starts with these bytes, so old entries stay readable.
+MSGPACK = b"\x01"
+MSGPACK_ZLIB = b"\x02"
+JSON_ZLIB = b"\x03"
+
+CACHE_ENCODING = environ.get("PFT_CACHE_ENCODING", "msgpack" if msgpack else "json")
+if CACHE_ENCODING == "msgpack" and not msgpack:
+    raise ValueError("PFT_CACHE_ENCODING=msgpack needs the msgpack package")
+# values at least this big are zlib compressed, 0 turns compression off
+CACHE_COMPRESS_MIN_BYTES = int(environ.get("PFT_CACHE_COMPRESS_MIN_BYTES", 1024))
+CACHE_COMPRESS_LEVEL = 1
+
+
+def pack(value) -> bytes:
+    """Encodes a cache value with the configured encoding"""
+    if CACHE_ENCODING == "msgpack":
+        data = msgpack.packb(value, default=_default, use_bin_type=True)
+        marker, zipped_marker = MSGPACK, MSGPACK_ZLIB
+    else:
+        data = dumps(value)
+        marker, zipped_marker = b"", JSON_ZLIB
+    if CACHE_COMPRESS_MIN_BYTES and len(data) >= CACHE_COMPRESS_MIN_BYTES:
+        return zipped_marker + zlib.compress(data, CACHE_COMPRESS_LEVEL)
+    return marker + data
+
+
+def unpack(data: bytes):
+    """Decodes a cache value written by pack, or a plain JSON one"""
+    marker = data[:1]
+    if marker == MSGPACK:
+        return msgpack.unpackb(data[1:], raw=False, strict_map_key=False)
+    if marker == MSGPACK_ZLIB:
+        return msgpack.unpackb(
+            zlib.decompress(data[1:]), raw=False, strict_map_key=False
+        )
+    if marker == JSON_ZLIB:
+        return loads(zlib.decompress(data[1:]))
+    return loads(data)
@@ -9,7 +9,9 @@ from starlette.status import (
     HTTP_403_FORBIDDEN,
     HTTP_404_NOT_FOUND,
     HTTP_400_BAD_REQUEST,
+    HTTP_429_TOO_MANY_REQUESTS,
     HTTP_500_INTERNAL_SERVER_ERROR,
+    HTTP_503_SERVICE_UNAVAILABLE,
 )
 
 
@@ -59,3 +61,25 @@ class Bad_Request(HTTPException):
             status_code=HTTP_400_BAD_REQUEST,
             detail=detail if detail else "Incomplete Request",
         )
+
+
+class ServiceUnavailable(HTTPException):
+    """Handles requests rejected because the server is saturated"""
+
+    def __init__(self, detail: str = "") -> None:
+        super().__init__(
+            status_code=HTTP_503_SERVICE_UNAVAILABLE,
+            detail=detail if detail else "Service Unavailable",
+            headers={"Retry-After": "1"},
+        )
+
+
+class TooManyRequests(HTTPException):
+    """Handles requests rejected by a rate limit"""
+
+    def __init__(self, detail: str = "", retry_after: int = 1) -> None:
+        super().__init__(
+            status_code=HTTP_429_TOO_MANY_REQUESTS,
+            detail=detail if detail else "Too Many Requests",
+            headers={"Retry-After": str(retry_after)},
+        )
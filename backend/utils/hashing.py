@@ -0,0 +1,81 @@
+#!/usr/bin/python3
+"""Module that runs bcrypt off the event loop"""
+import asyncio
+from bcrypt import checkpw
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from os import cpu_count, environ
+from utils.errors import ServiceUnavailable
+from utils.utils import hash_password
+
+load_dotenv()
+
+
+class PasswordHasher:
+    """Runs bcrypt on a bounded thread pool and sheds load when it is full"""
+
+    def __init__(self, workers: int, max_queue: int):
+        # bcrypt releases the GIL while hashing, so threads run in parallel
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="bcrypt"
+        )
+        self.workers = workers
+        self.max_pending = workers + max_queue
+        self.pending = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    async def _run(self, func, *args):
+        """Runs func on the pool, or raises a 503 when the queue is full"""
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise ServiceUnavailable("Server busy, please try again shortly")
+        loop = asyncio.get_running_loop()
+        self.pending += 1
+        future = loop.run_in_executor(self.executor, func, *args)
+        # the slot is held until the thread is done, also when the caller is
+        # cancelled (a client disconnecting) and stops waiting for it
+        future.add_done_callback(self._release)
+        return await asyncio.shield(future)
+
+    def _release(self, future):
+        """Frees the slot of a finished job and counts how it ended"""
+        self.pending -= 1
+        if not future.cancelled() and future.exception() is None:
+            self.completed += 1
+        else:
+            self.failed += 1
+
+    async def hash(self, password: str) -> str:
+        """Hashes a user's password"""
+        return await self._run(hash_password, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        """Verifies a password against its stored hash"""
+        if not password or type(password) is not str or not hashed_password:
+            return False
+        return await self._run(
+            checkpw, password.encode("utf-8"), hashed_password.encode("utf-8")
+        )
+
+    def stats(self) -> dict:
+        """Returns the pool counters"""
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self):
+        """Stops the worker threads"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+password_hasher = PasswordHasher(
+    workers=int(environ.get("PFT_HASH_WORKERS", min(4, cpu_count() or 1))),
+    max_queue=int(environ.get("PFT_HASH_QUEUE", 64)),
+)
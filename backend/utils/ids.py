@@ -0,0 +1,45 @@
+#!/usr/bin/python3
+"""Module for primary keys: time-ordered UUIDv7 ids stored as BINARY(16)"""
+from os import urandom
+from sqlalchemy.types import BINARY, TypeDecorator
+from time import time_ns
+from uuid import UUID
+
+_VERSION_MASK = ~(0xF << 76) & ~(0x3 << 62)
+_VERSION_BITS = 0x7 << 76 | 0x2 << 62
+
+
+def uuid7() -> UUID:
+    """Returns a UUIDv7: 48 bits of Unix milliseconds then 74 random bits,
+    so ids created later sort after earlier ones"""
+    value = (time_ns() // 1_000_000) << 80 | int.from_bytes(urandom(10), "big")
+    return UUID(int=value & _VERSION_MASK | _VERSION_BITS)
+
+
+def new_id() -> str:
+    """Returns a new primary key in its API form"""
+    return str(uuid7())
+
+
+class BinaryId(TypeDecorator):
+    """A UUID kept in BINARY(16) and exchanged as its 36 character string.
+    Byte order follows the string, so UUIDv7 keys insert in index order"""
+
+    impl = BINARY(16)
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None or isinstance(value, bytes):
+            return value
+        if isinstance(value, UUID):
+            return value.bytes
+        try:
+            return UUID(value).bytes
+        except (TypeError, ValueError):
+            # not an id, so it cannot match one: lookups find nothing
+            return b""
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return str(UUID(bytes=value))
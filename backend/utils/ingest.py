@@ -0,0 +1,41 @@
+#!/usr/bin/python3
+"""Module for streaming records out of uploaded CSV and NDJSON files"""
+import csv
+import io
+import json
+from fastapi import UploadFile
+
+IMPORT_FORMATS = ("csv", "ndjson")
+
+
+def detect_format(file: UploadFile, requested: str = None) -> str:
+    """Works out the format of an upload from the request, name or type"""
+    if requested:
+        return requested.lower()
+    name = (file.filename or "").lower()
+    if name.endswith((".ndjson", ".jsonl")) or "ndjson" in (file.content_type or ""):
+        return "ndjson"
+    return "csv"
+
+
+def iter_records(file: UploadFile, file_format: str):
+    """Yields (line number, record) pairs one at a time from an upload.
+    The upload is already spooled to disk, so only one row is held in memory"""
+    file.file.seek(0)
+    text = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+    try:
+        if file_format == "ndjson":
+            for line_number, line in enumerate(text, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    yield line_number, json.loads(line)
+                except json.JSONDecodeError:
+                    yield line_number, None
+        else:
+            reader = csv.DictReader(text)
+            for record in reader:
+                yield reader.line_num, record
+    finally:
+        # keep the underlying upload open for FastAPI to close
+        text.detach()
@@ -0,0 +1,48 @@
+#!/usr/bin/python3
+"""Module for money: amounts are kept as integer minor units (cents, kobo)
+in BIGINT columns and only become decimals at the API boundary"""
+from decimal import Decimal
+from dotenv import load_dotenv
+from os import environ
+from pydantic import AfterValidator, Field, PlainSerializer
+from sqlalchemy import BigInteger
+from sqlalchemy.types import TypeDecorator
+from typing import Annotated
+
+load_dotenv()
+
+DEFAULT_CURRENCY = environ.get("PFT_DEFAULT_CURRENCY", "NGN")
+# every currency is kept in hundredths of its unit
+MINOR_UNITS = 100
+
+
+def to_minor(amount: Decimal) -> int:
+    """Converts an amount in currency units to minor units"""
+    return int(amount * MINOR_UNITS)
+
+
+def to_major(minor: int) -> float:
+    """Converts minor units to the currency units sent to clients"""
+    return minor / MINOR_UNITS
+
+
+class Money(TypeDecorator):
+    """An amount in minor units. SUM over it comes back as DECIMAL from
+    MySQL, results are turned back into exact ints"""
+
+    impl = BigInteger
+    cache_ok = True
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else int(value)
+
+
+# request amounts: positive, at most 2 decimal places, parsed without going
+# through float and handed to the crud layer in minor units
+MoneyAmount = Annotated[
+    Decimal,
+    Field(gt=0, max_digits=15, decimal_places=2),
+    AfterValidator(to_minor),
+    PlainSerializer(int, return_type=int),
+]
+Currency = Annotated[str, Field(pattern=r"^[A-Z]{3}$", description="ISO 4217 code")]
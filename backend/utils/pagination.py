@@ -0,0 +1,83 @@
+#!/usr/bin/python3
+"""Module for keyset (cursor) pagination"""
+import base64
+import json
+from datetime import datetime
+from dotenv import load_dotenv
+from os import environ
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from storage.redis import redis_cache
+
+load_dotenv()
+
+MAX_PAGE_LIMIT = int(environ.get("PFT_MAX_PAGE_LIMIT", 100))
+# how long a page total may be served from the cache
+TOTAL_TTL = int(environ.get("PFT_PAGE_TOTAL_TTL", 60))
+
+
+def encode_cursor(sort_value: datetime, row_id: str) -> str:
+    """Creates an opaque cursor pointing just after a row. A NULL sort value,
+    e.g. a legacy row without a timestamp, is kept as null"""
+    sort_value = sort_value.isoformat() if sort_value is not None else None
+    raw = json.dumps([sort_value, row_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime | None, str]:
+    """Reads a cursor back. Raises ValueError for anything malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        sort_value, row_id = json.loads(raw)
+        if sort_value is not None:
+            sort_value = datetime.fromisoformat(sort_value)
+        return sort_value, str(row_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+async def paginate(
+    db: AsyncSession,
+    query,
+    model,
+    limit: int,
+    cursor: str = None,
+    sort_column=None,
+) -> tuple[list, str]:
+    """Returns one page of a query, newest first, and the cursor of the next.
+    Rows are ordered by (sort_column, id), created_at by default, so every
+    page is one index range scan however deep it is. Rows with a NULL sort
+    value come last, as MySQL and SQLite order them in a descending sort.
+    The query selects columns, e.g. ModelSerializer.select(), and the page
+    is a list of rows"""
+    sort_column = model.created_at if sort_column is None else sort_column
+    limit = min(limit, MAX_PAGE_LIMIT)
+    if cursor:
+        sort_value, row_id = decode_cursor(cursor)
+        if sort_value is None:
+            after = and_(sort_column.is_(None), model.id < row_id)
+        else:
+            after = or_(
+                sort_column < sort_value,
+                and_(sort_column == sort_value, model.id < row_id),
+                sort_column.is_(None),
+            )
+        query = query.where(after)
+    query = query.order_by(sort_column.desc(), model.id.desc()).limit(limit + 1)
+    rows = (await db.execute(query)).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, sort_column.key), last.id)
+    return rows, next_cursor
+
+
+async def cached_total(db: AsyncSession, query, key: str) -> int:
+    """Counts the rows of a query, reusing the count for TOTAL_TTL seconds"""
+    total = await redis_cache.get(key)
+    if total is not None:
+        return total
+    total = await db.scalar(select(func.count()).select_from(query.subquery()))
+    await redis_cache.set(key=key, value=total, exp_seconds=TOTAL_TTL)
+    return total
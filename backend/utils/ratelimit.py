@@ -0,0 +1,163 @@
+#!/usr/bin/python3
+"""Module for token bucket admission control"""
+import math
+import redis.exceptions
+from dotenv import load_dotenv
+from fastapi import Depends, Request
+from os import environ
+from storage.redis import redis_cache
+from time import monotonic
+from utils.errors import TooManyRequests
+
+load_dotenv()
+
+
+def parse_limit(value: str) -> tuple[int, int]:
+    """Parses a "capacity/seconds" limit, e.g. "5/60" is 5 requests a minute"""
+    capacity, seconds = value.split("/")
+    return int(capacity), int(seconds)
+
+
+# route -> identity -> (bucket capacity, seconds to refill a full bucket)
+RATE_LIMITS = {
+    "login": {
+        "ip": parse_limit(environ.get("PFT_RATE_LIMIT_LOGIN_IP", "20/60")),
+        "email": parse_limit(environ.get("PFT_RATE_LIMIT_LOGIN_EMAIL", "5/60")),
+    },
+    "register": {
+        "ip": parse_limit(environ.get("PFT_RATE_LIMIT_REGISTER_IP", "10/600")),
+    },
+}
+
+# Checks every bucket and only takes a token from each if all of them have
+# one, so a request is either admitted everywhere or nowhere.
+# KEYS: bucket keys, ARGV: capacity and refill rate per ms for each key.
+# Returns 0 when admitted, otherwise the milliseconds until a retry can pass.
+TOKEN_BUCKET_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local levels = {}
+local wait = 0
+for i = 1, #KEYS do
+    local capacity = tonumber(ARGV[i * 2 - 1])
+    local rate = tonumber(ARGV[i * 2])
+    local state = redis.call('HMGET', KEYS[i], 'tokens', 'ts')
+    local level = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    level = math.min(capacity, level + math.max(now - ts, 0) * rate)
+    if level < 1 then
+        wait = math.max(wait, math.ceil((1 - level) / rate))
+    end
+    levels[i] = level
+end
+for i = 1, #KEYS do
+    local capacity = tonumber(ARGV[i * 2 - 1])
+    local rate = tonumber(ARGV[i * 2])
+    local level = levels[i]
+    if wait == 0 then
+        level = level - 1
+    end
+    redis.call('HSET', KEYS[i], 'tokens', tostring(level), 'ts', tostring(now))
+    redis.call('PEXPIRE', KEYS[i], math.ceil(capacity / rate))
+end
+return wait
+"""
+
+
+class RedisTokenBuckets:
+    """Token buckets shared by every worker, checked in one round trip"""
+
+    def __init__(self, cache):
+        self.cache = cache
+        self.script = cache.r.register_script(TOKEN_BUCKET_SCRIPT)
+
+    async def take(self, buckets: list[tuple[str, int, int]]) -> float:
+        """Takes a token from every bucket, returns seconds to wait if denied"""
+        args = []
+        for _, capacity, seconds in buckets:
+            args.extend([capacity, capacity / (seconds * 1000)])
+        try:
+            wait_ms = await self.script(
+                keys=[key for key, _, _ in buckets], args=args, client=self.cache.r
+            )
+        except redis.exceptions.ConnectionError as e:
+            # fail open, the bcrypt pool still sheds load if Redis is down
+            print(f"Redis Connection Error: {e}")
+            return 0
+        return int(wait_ms) / 1000
+
+
+class LocalTokenBuckets:
+    """In-process token buckets, used for tests and single worker setups"""
+
+    def __init__(self):
+        self.buckets = {}  # key -> (tokens, last refill time)
+
+    async def take(self, buckets: list[tuple[str, int, int]]) -> float:
+        """Takes a token from every bucket, returns seconds to wait if denied"""
+        now = monotonic()
+        levels = []
+        wait = 0
+        for key, capacity, seconds in buckets:
+            rate = capacity / seconds
+            level, ts = self.buckets.get(key, (capacity, now))
+            level = min(capacity, level + (now - ts) * rate)
+            if level < 1:
+                wait = max(wait, (1 - level) / rate)
+            levels.append(level)
+        for (key, _, _), level in zip(buckets, levels):
+            self.buckets[key] = (level if wait else level - 1, now)
+        return wait
+
+
+class RateLimiter:
+    """Applies the configured limits of a route and counts the rejections"""
+
+    def __init__(self, backend, limits: dict):
+        self.backend = backend
+        self.limits = limits
+        self.admitted = {route: 0 for route in limits}
+        self.rejected = {route: 0 for route in limits}
+
+    async def hit(self, route: str, identities: dict[str, str]):
+        """Admits a request or raises TooManyRequests"""
+        buckets = [
+            (f"RateLimit:{route}:{kind}:{identities[kind]}", capacity, seconds)
+            for kind, (capacity, seconds) in self.limits[route].items()
+            if identities.get(kind)
+        ]
+        wait = await self.backend.take(buckets) if buckets else 0
+        if wait:
+            self.rejected[route] += 1
+            raise TooManyRequests(
+                "Too many attempts, please try again later",
+                retry_after=math.ceil(wait),
+            )
+        self.admitted[route] += 1
+
+    def stats(self) -> dict:
+        """Returns the admitted and rejected counts per route"""
+        return {
+            route: {"admitted": self.admitted[route], "rejected": self.rejected[route]}
+            for route in self.limits
+        }
+
+
+if environ.get("PFT_RATE_LIMIT_BACKEND", "redis") == "local":
+    rate_limiter = RateLimiter(LocalTokenBuckets(), RATE_LIMITS)
+else:
+    rate_limiter = RateLimiter(RedisTokenBuckets(redis_cache), RATE_LIMITS)
+
+
+def rate_limit(route: str):
+    """Dependency that rejects requests over a route's limits.
+    Runs before the route's other dependencies when used in `dependencies`"""
+
+    async def admit(request: Request):
+        identities = {"ip": request.client.host if request.client else None}
+        if "email" in rate_limiter.limits[route]:
+            form = await request.form()
+            identities["email"] = str(form.get("username", "")).strip().lower()
+        await rate_limiter.hit(route, identities)
+
+    return Depends(admit)
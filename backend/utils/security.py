@@ -2,6 +2,8 @@ from fastapi import UploadFile
 from crud.users import get_user_by_email
 from dotenv import load_dotenv
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy.ext.asyncio import AsyncSession
+from utils.hashing import password_hasher
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 from os import environ
@@ -31,13 +33,10 @@ def create_access_token(data: dict):
     return encoded_jwt
 
 
-def authenticate_user(email: str, password: str):
+async def authenticate_user(db: AsyncSession, email: str, password: str):
     """Authenticates the password of a user. Returns true if the password is correct"""
-    from storage.db import SessionLocal
-
-    db = SessionLocal()
-    user = get_user_by_email(email=email)
-    if user and user.is_valid_password(password):
+    user = await get_user_by_email(db, email=email)
+    if user and await password_hasher.verify(password, user.password):
         return user
     return False
 
@@ -0,0 +1,122 @@
+#!/usr/bin/python3
+"""Module for turning models and query rows into JSON/CSV ready values"""
+from models.budget import Budget
+from models.category import Category
+from models.expense import Expense
+from models.income import Income
+from models.user import User
+from operator import attrgetter, itemgetter
+from sqlalchemy import DateTime, Date, select
+from sqlalchemy.inspection import inspect
+from utils.money import MINOR_UNITS, Money
+
+# never leave the API, whatever the model
+SENSITIVE_FIELDS = ("password", "is_deleted", "deleted_by")
+
+
+def compile_row_serializer(columns: list):
+    """Builds a function mapping a row of `columns` to a list of plain values.
+    The columns needing conversion are picked once here, from their types,
+    instead of checking every value of every row"""
+    dates = [
+        index
+        for index, column in enumerate(columns)
+        if isinstance(column.type, (DateTime, Date))
+    ]
+    # minor units leave as currency units
+    amounts = [
+        index
+        for index, column in enumerate(columns)
+        if isinstance(column.type, Money)
+    ]
+    if not dates and not amounts:
+        return list
+
+    def serialize(row) -> list:
+        values = list(row)
+        for index in dates:
+            value = values[index]
+            if value is not None:
+                values[index] = value.isoformat()
+        for index in amounts:
+            value = values[index]
+            if value is not None:
+                values[index] = value / MINOR_UNITS
+        return values
+
+    return serialize
+
+
+class ModelSerializer:
+    """Conversion plan of one mapped class: its public columns in table
+    order, read with one attrgetter and converted by column type"""
+
+    def __init__(self, model):
+        attributes = [
+            attribute
+            for attribute in inspect(model).column_attrs
+            if attribute.key not in SENSITIVE_FIELDS
+        ]
+        self.model = model
+        self.keys = tuple(attribute.key for attribute in attributes)
+        self.columns = [getattr(model, key) for key in self.keys]
+        self.id_index = self.keys.index("id")
+        self._get = attrgetter(*self.keys)
+        # loaded values sit in the instance __dict__, skipping the descriptors
+        self._get_loaded = itemgetter(*self.keys)
+        self._convert = compile_row_serializer(
+            [attribute.columns[0] for attribute in attributes]
+        )
+
+    def select(self):
+        """SELECT of the public columns, for the rows path"""
+        return select(*self.columns)
+
+    def values(self, obj):
+        """The public column values of an ORM object, in table order"""
+        try:
+            return self._get_loaded(obj.__dict__)
+        except KeyError:
+            # expired or deferred attributes, let the ORM load them
+            return self._get(obj)
+
+    def to_dict(self, obj) -> dict:
+        """Serializes one ORM object"""
+        return dict(zip(self.keys, self._convert(self.values(obj))))
+
+    def many_to_dict(self, objs) -> dict:
+        """Serializes ORM objects into {id: object}"""
+        keys = self.keys
+        values = self.values
+        convert = self._convert
+        id_index = self.id_index
+        output = {}
+        for obj in objs:
+            row = convert(values(obj))
+            output[row[id_index]] = dict(zip(keys, row))
+        return output
+
+    def rows_to_dict(self, rows) -> dict:
+        """Serializes rows of select() into {id: object} without building
+        ORM objects"""
+        keys = self.keys
+        convert = self._convert
+        id_index = self.id_index
+        return {row[id_index]: dict(zip(keys, convert(row))) for row in rows}
+
+
+serializers = {}
+
+
+def serializer_for(model) -> ModelSerializer:
+    """Returns the serializer of a mapped class, building it on first use"""
+    serializer = serializers.get(model)
+    if serializer is None:
+        serializer = serializers[model] = ModelSerializer(model)
+    return serializer
+
+
+def build_serializers():
+    """Builds the serializers of every model up front"""
+    for model in (User, Category, Expense, Income, Budget):
+        serializer_for(model)
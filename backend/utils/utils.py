@@ -1,17 +1,19 @@
 #!/usr/bin/python3
 """Utility module"""
-from models.category import Category
 from sqlalchemy import exists
 import inflect
 import re
 from datetime import datetime
 import unicodedata
 from bcrypt import hashpw, checkpw, gensalt
-import re
+from dotenv import load_dotenv
 from fastapi import Depends, Request
+from functools import lru_cache
+from os import environ
 from sqlalchemy.orm import Session
-from sqlalchemy.inspection import inspect
+from utils.serializers import serializer_for
 
+load_dotenv()
 
 DEFAULT_CATEGORIES = [
     "Rent and Housing",
@@ -41,43 +43,24 @@ DEFAULT_CATEGORIES = [
 ]
 
 
-def create_default_categories():
-    """This creates default categories in the DB"""
-    from storage.db import SessionLocal
-
-    db = SessionLocal()
-    try:
-        for name in DEFAULT_CATEGORIES:
-            exist = (
-                db.query(Category)
-                .filter(Category.name == name, Category.user_id == None)
-                .first()
-            )
-            if not exist:
-                db.add(Category(name=name, user_id=None))
-        db.commit()
-    finally:
-        db.close()
+inflect_engine = inflect.engine()
+PUNCTUATION = re.compile(r"[^\w\s]")
 
 
+@lru_cache(maxsize=int(environ.get("PFT_CATEGORY_NAME_CACHE_SIZE", 10000)))
 def category_normalizer(name: str):
-    """This checks if a category has been entered before"""
-
-    inflect = inflect.engine()
-
-    name = name.lower()
-    name = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode("ascii")
-    name = name.replace("&", "and")
-    name = re.sub(r"[^\W\S]", "", name)  # remove punctuations
-    name = re.sub(r"\s+", " ", name)  # Collapse multiple spaces
-
-    words = name.split()
-    if len(words) > 0:
-        singular = inflect.singular_noun(words[-1])
+    """Normalizes a category name so that variants of it compare equal"""
+    if not name.isascii():
+        name = unicodedata.normalize("NFKD", name)
+        name = name.encode("ascii", "ignore").decode("ascii")
+    name = name.lower().replace("&", "and")
+    name = PUNCTUATION.sub("", name)  # remove punctuations
+    words = name.split()  # also collapses multiple spaces
+    if words:
+        singular = inflect_engine.singular_noun(words[-1])
         if singular:
             words[-1] = singular
-    name = " ".join(words)
-    return name
+    return " ".join(words)
 
 
 def check_if_word_exists(word: str = None, sentence: str = None) -> bool:
@@ -110,35 +93,58 @@ def hash_password(password: str) -> str:
 
 def model_to_dict(obj, request: Request = None):
     """Converts a model to a JSON serialized object"""
-    data = {}
-    for model in inspect(obj).mapper.column_attrs:
-        value = getattr(obj, model.key)
-        if isinstance(value, datetime):
-            value = value.isoformat()
-        data[model.key] = value
-    data.pop("password", None)
-    data.pop("is_deleted", None)
-    data.pop("deleted_by", None)
-    if "cover_image_url" in data and data["cover_image_url"] != None:
-        image_url = request.url_for("static", path=f"uploads/{data["cover_image_url"]}")
+    data = serializer_for(type(obj)).to_dict(obj)
+    if data.get("cover_image_url") is not None:
+        image_url = request.url_for("static", path=f"uploads/{data['cover_image_url']}")
         data["cover_image_url"] = str(image_url)
     return data
 
 
 def users_to_dict(users, request: Request = None):
+    """Converts models to {id: JSON serialized object}"""
+    users = list(users)
+    if not users:
+        return {}
+    if request is None:
+        return serializer_for(type(users[0])).many_to_dict(users)
     return {user.id: model_to_dict(user, request) for user in users}
 
 
+def naive_local(value: datetime):
+    """Converts a datetime given with a UTC offset to the server's local
+    time, the naive form timestamps are stored and compared in"""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone().replace(tzinfo=None)
+
+
 def create_user_key(user_id: str):
     """creates a cache key for users"""
     return f"User:{user_id}"
 
 
+def create_principal_key(user_id: str):
+    """creates a cache key for the role lookup used by the auth middleware"""
+    return f"Principal:{user_id}"
+
+
 def create_user_token_key(user_id: str):
     """creates a cache token key for users"""
     return f"UserSessionToken:{user_id}"
 
 
-def create_category_key(category_id: str):
-    """creates a cache key for categories"""
-    return f"Category:{category_id}"
+def create_categories_key(user_id: str = None):
+    """Creates the key of the hash of a user's categories, or of the
+    default ones without a user"""
+    return f"Categories:{user_id or 'default'}"
+
+
+def create_category_names_key(user_id: str = None):
+    """Creates the key of the normalized names of a user's categories,
+    or of the default ones without a user"""
+    return f"CategoryNames:{user_id or 'default'}"
+
+
+def create_budget_spend_key(user_id: str, period: str, start: datetime):
+    """Creates the key of a user's spend per category in a budget period"""
+    return f"BudgetSpend:{user_id}:{period}:{start.date().isoformat()}"